@@ -0,0 +1,103 @@
+import math
+import os
+import threading
+import time
+
+# ---------------------------------------------------------
+# AI判定の同時実行数の制限 (アドミッション制御)
+# 同時に実行できる数 (セマフォ) と、空きを待てる数 (待ち行列) に上限を設け、
+# あふれた要求はすぐに 503 + Retry-After で返す。
+# AIが遅いときに要求が溜まり続けて、軽いAPIまで遅くなるのを防ぐ。
+#
+#   PREDICT_MAX_CONCURRENT  ワーカーあたりの同時実行数 (既定 4)
+#   PREDICT_MAX_WAITING     ワーカーあたりの待ち行列の長さ (既定 8)
+#   PREDICT_WAIT_TIMEOUT    空きを待つ最大秒数 (既定 10秒)
+# ---------------------------------------------------------
+MAX_CONCURRENT = int(os.environ.get('PREDICT_MAX_CONCURRENT', 4))
+MAX_WAITING = int(os.environ.get('PREDICT_MAX_WAITING', 8))
+WAIT_TIMEOUT = float(os.environ.get('PREDICT_WAIT_TIMEOUT', 10))
+
+
+class Rejected(Exception):
+    """混雑のため受け付けなかった (retry_after 秒後に再試行してほしい)"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+
+    def __init__(self, max_concurrent=None, max_waiting=None, wait_timeout=None):
+        self.max_concurrent = max_concurrent or MAX_CONCURRENT
+        self.max_waiting = max_waiting if max_waiting is not None else MAX_WAITING
+        self.wait_timeout = wait_timeout or WAIT_TIMEOUT
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._avg_seconds = None   # 1件の処理時間の移動平均 (Retry-After の見積もり用)
+        self._local = threading.local()
+
+    def retry_after(self):
+        """待ち行列がはけるまでのおおよその秒数"""
+        avg = self._avg_seconds or 5.0
+        return max(1, math.ceil(avg * (self.waiting + 1) / self.max_concurrent))
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.max_concurrent and self.waiting == 0:
+                self.in_flight += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.max_waiting:
+                self.rejected_queue_full += 1
+                raise Rejected("queue_full", self.retry_after())
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.wait_timeout
+            try:
+                while self.in_flight >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_timeout += 1
+                        raise Rejected("wait_timeout", self.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self, elapsed):
+        with self._cond:
+            self.in_flight -= 1
+            if self._avg_seconds is None:
+                self._avg_seconds = elapsed
+            else:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        self._local.started_at = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release(time.monotonic() - self._local.started_at)
+        return False
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_waiting": self.max_waiting,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "avg_seconds": round(self._avg_seconds, 2) if self._avg_seconds else None,
+            }
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from google import genai
+from google.genai import types
+
+# ---------------------------------------------------------
+# AIの呼び出し先の切り替え (負荷試験・ベンチマーク用)
+# クォータやネットワークに頼らずに、リトライ・ヘッジ・キャッシュの動きを測れるようにする。
+#
+#   AI_BACKEND      gemini  本物の Gemini API (既定)
+#                   stub    ローカルの代用サーバー (ai_stub_server.py) に送る
+#                   record  本物 (または stub) の応答をファイルに記録しながら呼ぶ
+#                   replay  記録した応答を、同じ要求に対して同じ順番で返す (ネットワーク不要)
+#   AI_STUB_URL     stub の URL (既定 http://127.0.0.1:8765)
+#   AI_RECORD_DIR   記録を置くフォルダ (既定 一時ディレクトリ/banana_ai_recordings)
+#   AI_RECORD_UPSTREAM  record のときの呼び出し先 gemini / stub (既定 gemini)
+#   AI_REPLAY_LATENCY   1 なら replay で記録したときの応答時間だけ待つ (既定 0)
+# ---------------------------------------------------------
+MODE = os.environ.get('AI_BACKEND', 'gemini')
+STUB_URL = os.environ.get('AI_STUB_URL', 'http://127.0.0.1:8765')
+RECORD_DIR = os.environ.get('AI_RECORD_DIR') or os.path.join(tempfile.gettempdir(), 'banana_ai_recordings')
+RECORD_UPSTREAM = os.environ.get('AI_RECORD_UPSTREAM', 'gemini')
+REPLAY_LATENCY = os.environ.get('AI_REPLAY_LATENCY', '0') == '1'
+
+_file_lock = threading.Lock()
+
+
+class ReplayMissing(LookupError):
+    """replay で、記録にない要求が来た"""
+
+
+class ReplayedError(Exception):
+    """記録しておいたエラーを再現したもの (メッセージは元のエラーと同じ)"""
+
+
+def make_client():
+    """AI_BACKEND に応じたクライアントを作る (models.generate_content / generate_content_stream を持つ)"""
+    if MODE == 'stub':
+        return _stub_client()
+    if MODE == 'record':
+        upstream = _stub_client() if RECORD_UPSTREAM == 'stub' else _gemini_client()
+        return _Client(_RecordingModels(upstream))
+    if MODE == 'replay':
+        return _Client(_ReplayingModels())
+    return _gemini_client()
+
+
+def _gemini_client():
+    return genai.Client(api_key=os.environ.get('GEMINI_API_KEY'))
+
+
+def _stub_client():
+    # 代用サーバーは Gemini の REST API と同じ形で答えるので、SDK はそのまま使う
+    return genai.Client(
+        api_key=os.environ.get('GEMINI_API_KEY') or 'stub',
+        http_options=types.HttpOptions(base_url=STUB_URL),
+    )
+
+
+# ---------------------------------------------------------
+# 記録と再生
+# 要求 (モデル名・内容・設定) の SHA-256 ごとに1ファイル。
+# 同じ要求を何度も呼んだ場合は応答を順番に記録し、再生でも同じ順番で返す
+# (1回目は 503、2回目で成功、のような流れもそのまま再現できる)。
+# ---------------------------------------------------------
+
+def request_key(model, contents, config, stream=False):
+    h = hashlib.sha256()
+    h.update(f"{model}\0{'stream' if stream else 'unary'}\0".encode('utf-8'))
+    for item in contents if isinstance(contents, list) else [contents]:
+        inline = getattr(item, 'inline_data', None)
+        if isinstance(item, str):
+            h.update(item.encode('utf-8'))
+        elif inline is not None:
+            h.update((inline.mime_type or '').encode('utf-8'))
+            h.update(inline.data or b'')
+        else:
+            h.update(repr(item).encode('utf-8'))
+        h.update(b'\0')
+    h.update(json.dumps(config, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _path(key):
+    return os.path.join(RECORD_DIR, f"{key}.json")
+
+
+def _load(key):
+    try:
+        with open(_path(key), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _append(key, model, call):
+    with _file_lock:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        record = _load(key) or {"model": model, "calls": []}
+        record["calls"].append(call)
+        tmp_path = _path(key) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, _path(key))
+
+
+def _dump(response):
+    return response.model_dump(mode='json', exclude_none=True)
+
+
+def _restore(data):
+    return types.GenerateContentResponse.model_validate(data)
+
+
+class _Client:
+    def __init__(self, models):
+        self.models = models
+
+
+class _RecordingModels:
+
+    def __init__(self, upstream):
+        # クライアント本体も持っておく (手放すと SDK が接続を閉じてしまう)
+        self._upstream = upstream
+        self._models = upstream.models
+
+    def generate_content(self, model, contents, config=None):
+        key = request_key(model, contents, config)
+        started = time.monotonic()
+        try:
+            response = self._models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            _append(key, model, {"error": str(e), "seconds": time.monotonic() - started})
+            raise
+        _append(key, model, {"response": _dump(response), "seconds": time.monotonic() - started})
+        return response
+
+    def generate_content_stream(self, model, contents, config=None):
+        key = request_key(model, contents, config, stream=True)
+        started = time.monotonic()
+        chunks = []
+        try:
+            for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+                chunks.append({"chunk": _dump(chunk), "seconds": time.monotonic() - started})
+                yield chunk
+        except Exception as e:
+            _append(key, model, {"chunks": chunks, "error": str(e), "seconds": time.monotonic() - started})
+            raise
+        _append(key, model, {"chunks": chunks, "seconds": time.monotonic() - started})
+
+
+class _ReplayingModels:
+
+    def __init__(self):
+        self._counts = {}      # キー -> 何回目の呼び出しか
+        self._lock = threading.Lock()
+
+    def _next_call(self, key):
+        record = _load(key)
+        if not record or not record["calls"]:
+            raise ReplayMissing(f"no recording for request {key[:12]}")
+        with self._lock:
+            index = self._counts.get(key, 0)
+            self._counts[key] = index + 1
+        # 記録した回数より多く呼ばれたら、最後の応答を返し続ける
+        return record["calls"][min(index, len(record["calls"]) - 1)]
+
+    def generate_content(self, model, contents, config=None):
+        call = self._next_call(request_key(model, contents, config))
+        if REPLAY_LATENCY:
+            time.sleep(call.get("seconds", 0))
+        if "error" in call:
+            raise ReplayedError(call["error"])
+        return _restore(call["response"])
+
+    def generate_content_stream(self, model, contents, config=None):
+        call = self._next_call(request_key(model, contents, config, stream=True))
+        started = time.monotonic()
+        for chunk in call.get("chunks", []):
+            if REPLAY_LATENCY:
+                time.sleep(max(chunk["seconds"] - (time.monotonic() - started), 0))
+            yield _restore(chunk["chunk"])
+        if REPLAY_LATENCY:
+            time.sleep(max(call.get("seconds", 0) - (time.monotonic() - started), 0))
+        if "error" in call:
+            raise ReplayedError(call["error"])
@@ -0,0 +1,212 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+# ---------------------------------------------------------
+# AIモデルの並列フォールバック (ヘッジ付き)
+# 1つ目のモデルがいつもの応答時間 (パーセンタイル) を過ぎても返ってこなければ、
+# 次のモデルにも同時に投げ、最初に返ってきた正しい回答を使う。
+# リクエスト全体の持ち時間 (deadline) を超えたら打ち切る。
+#
+#   AI_DEADLINE_SECONDS  1リクエストの持ち時間 (既定 20秒)
+#   AI_HEDGE_PERCENTILE  ヘッジを出すまでの待ち時間に使うパーセンタイル (既定 90)
+#   AI_HEDGE_DEFAULT     応答時間の実績が少ないうちの待ち時間 (既定 6秒)
+#   AI_MAX_ATTEMPTS      1モデルあたりの試行回数 (既定 2)
+#   AI_WORKERS           同時に待つAI呼び出しの数 (既定 8)
+#                        持ち時間切れやヘッジ負けで結果を待たなくなった呼び出しは数えない
+#                        (取り消せないので HTTP の待ち時間が切れるまで別スレッドで終わるのを待つ)
+# ---------------------------------------------------------
+DEADLINE_SECONDS = float(os.environ.get('AI_DEADLINE_SECONDS', 20))
+HEDGE_PERCENTILE = float(os.environ.get('AI_HEDGE_PERCENTILE', 90))
+HEDGE_DEFAULT = float(os.environ.get('AI_HEDGE_DEFAULT', 6))
+HEDGE_MIN = 1.0
+MAX_ATTEMPTS = int(os.environ.get('AI_MAX_ATTEMPTS', 2))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 4.0
+MIN_SAMPLES = 10
+
+WORKERS = int(os.environ.get('AI_WORKERS', 8))
+
+_slots = threading.BoundedSemaphore(WORKERS)   # 結果を待っている呼び出しの枠
+_latencies = {}        # model_name -> 直近の成功時の応答時間 (秒)
+_latency_lock = threading.Lock()
+
+
+class AllModelsFailed(Exception):
+    """全モデルが失敗した、または持ち時間を使い切った"""
+
+    def __init__(self, last_error, timed_out=False):
+        super().__init__(str(last_error))
+        self.last_error = last_error
+        self.timed_out = timed_out
+
+
+class _Slot:
+    """呼び出し1回分の枠。呼び出しが終わるか、結果を待たなくなった時点で1回だけ返す"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._released = False
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        _slots.release()
+
+
+def submit(call, model_name, deadline):
+    """
+    call(model_name) を専用スレッドで始め、(Future, 枠) を返す。
+    枠が空くまで deadline (time.monotonic() の時刻) まで待ち、空かなければ TimeoutError。
+    """
+    if not _slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        raise TimeoutError("no free AI call slot before the deadline")
+    slot = _Slot()
+    future = Future()
+
+    def run():
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(call(model_name))
+            except BaseException as e:
+                future.set_exception(e)
+        finally:
+            slot.release()
+
+    threading.Thread(target=run, name=f'ai-call-{model_name}', daemon=True).start()
+    return future, slot
+
+
+def is_retryable(error):
+    """一時的なエラー (503 / UNAVAILABLE) なら同じモデルでもう一度試す価値がある"""
+    msg = str(error)
+    return "503" in msg or "UNAVAILABLE" in msg
+
+
+def record_latency(model_name, seconds):
+    with _latency_lock:
+        _latencies.setdefault(model_name, deque(maxlen=100)).append(seconds)
+
+
+def hedge_delay(model_name):
+    """このモデルの応答時間のパーセンタイル。これを過ぎたら次のモデルにも投げる"""
+    with _latency_lock:
+        samples = sorted(_latencies.get(model_name, ()))
+    if len(samples) < MIN_SAMPLES:
+        return HEDGE_DEFAULT
+    index = min(int(len(samples) * HEDGE_PERCENTILE / 100), len(samples) - 1)
+    return max(samples[index], HEDGE_MIN)
+
+
+def backoff_delay(attempt):
+    """指数バックオフ + フルジッター (同時に失敗した要求が一斉に再送しないように)"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def run_with_fallback(call, models, deadline_seconds=None, max_attempts=None):
+    """
+    call(model_name) を models の順に試し、最初に成功した (結果, モデル名) を返す。
+    call は失敗時に例外を投げること (JSONが壊れている場合も含む)。
+    すべて失敗するか持ち時間を使い切ったら AllModelsFailed を投げる。
+    deadline_seconds は残りの持ち時間 (省略すると AI_DEADLINE_SECONDS)。
+    """
+    if deadline_seconds is None:
+        deadline_seconds = DEADLINE_SECONDS
+    deadline = time.monotonic() + deadline_seconds
+    max_attempts = max_attempts or MAX_ATTEMPTS
+
+    if not models:
+        raise AllModelsFailed(RuntimeError("no models to try"))
+    if deadline_seconds <= 0:
+        raise AllModelsFailed(TimeoutError("AI deadline exceeded"), timed_out=True)
+
+    pending = {}           # Future -> (model_name, attempt, started_at, 枠)
+    retries = []           # [(開始時刻, model_name, attempt), ...]
+    next_model = 0         # 次に投入するモデルの番号
+    hedge_at = None        # この時刻を過ぎたら次のモデルをヘッジとして投入
+    last_error = None
+
+    def launch(model_name, attempt):
+        nonlocal hedge_at
+        print(f"DEBUG: Trying AI Model -> {model_name} (Attempt {attempt + 1})")
+        try:
+            future, slot = submit(call, model_name, deadline)
+        except TimeoutError as e:
+            raise AllModelsFailed(last_error or e, timed_out=True)
+        pending[future] = (model_name, attempt, time.monotonic(), slot)
+        hedge_at = time.monotonic() + hedge_delay(model_name)
+
+    def launch_next_model():
+        nonlocal next_model
+        if next_model < len(models):
+            launch(models[next_model], 0)
+            next_model += 1
+            return True
+        return False
+
+    launch_next_model()
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                raise AllModelsFailed(last_error or TimeoutError("AI deadline exceeded"), timed_out=True)
+
+            # 待ち時間が来たリトライを投入
+            for item in [r for r in retries if r[0] <= now]:
+                retries.remove(item)
+                launch(item[1], item[2])
+
+            # 応答が遅ければ次のモデルにも投げる (ヘッジ)
+            if pending and hedge_at is not None and now >= hedge_at:
+                if not launch_next_model():
+                    hedge_at = None
+
+            if not pending and not retries:
+                if not launch_next_model():
+                    raise AllModelsFailed(last_error)
+                continue
+
+            wake_times = [deadline]
+            if hedge_at is not None and pending:
+                wake_times.append(hedge_at)
+            wake_times.extend(r[0] for r in retries)
+            timeout = max(min(wake_times) - time.monotonic(), 0)
+
+            if not pending:
+                # リトライ待ちだけのときは wait([]) がすぐ戻って空回りするので、時間まで眠る
+                time.sleep(timeout)
+                continue
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                model_name, attempt, started_at, _ = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    print(f"WARNING: {model_name} failed: {e}")
+                    delay = backoff_delay(attempt)
+                    if (is_retryable(e) and attempt + 1 < max_attempts
+                            and time.monotonic() + delay < deadline):
+                        retries.append((time.monotonic() + delay, model_name, attempt + 1))
+                    else:
+                        # このモデルはあきらめて、すぐ次のモデルへ
+                        launch_next_model()
+                    continue
+
+                record_latency(model_name, time.monotonic() - started_at)
+                return result, model_name
+    finally:
+        # 残りの呼び出しは結果を使わないので、枠を返す
+        # (始まっている呼び出しは止められないが、HTTP の待ち時間が持ち時間までなので長くは残らない)
+        for future, (_, _, _, slot) in pending.items():
+            future.cancel()
+            slot.release()
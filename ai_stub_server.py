@@ -0,0 +1,209 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import data_loader
+
+# ---------------------------------------------------------
+# Gemini API のローカル代用サーバー (負荷試験・ベンチマーク用)
+# REST API と同じ形 (models/{model}:generateContent / :streamGenerateContent) で答えるので、
+# AI_BACKEND=stub にすればアプリも translate_all.py もそのまま動く。
+# 応答時間の分布・503 の割合・壊れたJSONの割合を変えて、リトライやヘッジの動きを測れる。
+#
+#   AI_STUB_PORT            待ち受けるポート (既定 8765)
+#   AI_STUB_LATENCY         応答時間の分布 (既定 lognormal:1.5,0.5)
+#                             fixed:秒 / uniform:最小,最大 / normal:平均,標準偏差 / lognormal:中央値,σ
+#   AI_STUB_ERROR_RATE      503 UNAVAILABLE を返す割合 (既定 0)
+#   AI_STUB_MALFORMED_RATE  壊れたJSONを返す割合 (既定 0)
+#   AI_STUB_MODELS          モデルごとの上書き (JSON) 例: {"gemini-pro-latest": {"latency": "fixed:4", "error_rate": 0.2}}
+#   AI_STUB_SEED            乱数の種 (指定すると毎回同じ順番で起きる)
+#
+# 起動: python ai_stub_server.py
+# ---------------------------------------------------------
+PORT = int(os.environ.get('AI_STUB_PORT', 8765))
+DEFAULTS = {
+    "latency": os.environ.get('AI_STUB_LATENCY', 'lognormal:1.5,0.5'),
+    "error_rate": float(os.environ.get('AI_STUB_ERROR_RATE', 0)),
+    "malformed_rate": float(os.environ.get('AI_STUB_MALFORMED_RATE', 0)),
+}
+MODEL_SETTINGS = json.loads(os.environ.get('AI_STUB_MODELS', '{}'))
+STREAM_CHUNKS = 4
+
+_PATH = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)")
+_random = random.Random(os.environ.get('AI_STUB_SEED'))
+_random_lock = threading.Lock()
+
+
+def settings(model):
+    return {**DEFAULTS, **MODEL_SETTINGS.get(model, {})}
+
+
+def sample_latency(spec):
+    """分布の指定 (例 lognormal:1.5,0.5) から応答時間を1つ選ぶ"""
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+    with _random_lock:
+        if kind == 'fixed':
+            seconds = values[0]
+        elif kind == 'uniform':
+            seconds = _random.uniform(values[0], values[1])
+        elif kind == 'normal':
+            seconds = _random.gauss(values[0], values[1])
+        elif kind == 'lognormal':
+            seconds = values[0] * _random.lognormvariate(0, values[1])
+        else:
+            raise ValueError(f"unknown latency distribution: {spec}")
+    return max(seconds, 0.0)
+
+
+def chance(rate):
+    with _random_lock:
+        return _random.random() < rate
+
+
+def random_row():
+    rows = data_loader.get_dictionary_list()
+    with _random_lock:
+        return _random.choice(rows)
+
+
+_LEGEND = re.compile(r"(\d+):[^,()]*\(([^)]+)\)")
+
+
+def fake_item(row, prompt):
+    """辞書の1行を、AIが答えたような1品物の dict にする"""
+    english = "Target Language: Japanese" not in prompt
+    # type_id はプロンプトの一覧 (例: 8:Bottles/Cans/PET (びん・缶・ペット)) から選ぶ
+    legend = [(int(type_id), name) for type_id, name in _LEGEND.findall(prompt)]
+    type_id = legend[0][0] if legend else 1
+    for key, name in legend:
+        if row.get('trash_type_str', '').startswith(name):
+            type_id = key
+            break
+    return {
+        "identified_name": row.get('name_en') if english else row.get('name_ja'),
+        "type_id": type_id,
+        "type_name": row.get('trash_type_str', ''),
+        "reason": row.get('note_en') if english else row.get('note_ja'),
+    }
+
+
+def fake_answer(prompt, num_images):
+    """プロンプトの種類 (翻訳 / まとめて判定 / 品名 / 画像) に合わせた回答の JSON 文字列"""
+    if '翻訳対象データ' in prompt:
+        lines = [l.strip() for l in prompt.split('翻訳対象データ:', 1)[-1].splitlines() if l.strip()]
+        result = []
+        for line in lines:
+            name, type_str, fee, note = (line.split(',', 3) + ['', '', ''])[:4]
+            result.append({
+                "name_ja": name, "name_en": name, "name_zh_cn": name, "name_ko": name,
+                "name_vi": name, "name_ru": name, "name_id": name,
+                "note_ja": note, "note_en": note, "fee": fee, "trash_type_str": type_str,
+            })
+        return json.dumps(result, ensure_ascii=False)
+
+    if '"items"' in prompt:
+        items = []
+        for index in range(max(num_images, 1)):
+            item = fake_item(random_row(), prompt)
+            item["image_index"] = index
+            items.append(item)
+        return json.dumps({"items": items}, ensure_ascii=False)
+
+    item = fake_item(random_row(), prompt)
+    query = re.search(r'throw away this item: "(.*)"', prompt)
+    if query:
+        item["identified_name"] = query.group(1)
+    return json.dumps(item, ensure_ascii=False)
+
+
+def response_body(text, prompt_tokens, finished=True):
+    body = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+    if finished:
+        body["candidates"][0]["finishReason"] = "STOP"
+        output_tokens = len(text) // 4 + 1
+        body["usageMetadata"] = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        }
+    return body
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        match = _PATH.search(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not match:
+            return self.send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+        model, method = match.groups()
+        config = settings(model)
+        latency = sample_latency(config["latency"])
+
+        parts = [p for c in request.get('contents', []) for p in c.get('parts', [])]
+        prompt = "\n".join(p['text'] for p in parts if 'text' in p)
+        num_images = sum(1 for p in parts if 'inlineData' in p or 'inline_data' in p)
+        prompt_tokens = len(prompt) // 4 + 258 * num_images
+
+        if chance(config["error_rate"]):
+            time.sleep(latency / 2)
+            return self.send_json(503, {"error": {
+                "code": 503, "message": "The model is overloaded. Please try again later.", "status": "UNAVAILABLE"
+            }})
+
+        text = fake_answer(prompt, num_images)
+        if chance(config["malformed_rate"]):
+            text = text[:len(text) // 2]
+
+        if method == 'generateContent':
+            time.sleep(latency)
+            return self.send_json(200, response_body(text, prompt_tokens))
+        self.send_stream(text, prompt_tokens, latency)
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, text, prompt_tokens, latency):
+        # 最初の断片は応答時間の 4 割で、残りは均等な間隔で送る
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        size = max(len(text) // STREAM_CHUNKS + 1, 1)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        time.sleep(latency * 0.4)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(latency * 0.6 / len(pieces))
+            body = response_body(piece, prompt_tokens, finished=(i == len(pieces) - 1))
+            self.wfile.write(f"data: {json.dumps(body, ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        print(f"STUB: {self.address_string()} {format % args}")
+
+
+def main():
+    data_loader.load_data()
+    server = ThreadingHTTPServer(('127.0.0.1', PORT), StubHandler)
+    print(f"✔ Gemini stub listening on http://127.0.0.1:{PORT} (latency={DEFAULTS['latency']}, "
+          f"error_rate={DEFAULTS['error_rate']}, malformed_rate={DEFAULTS['malformed_rate']})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import Counter
+
+import data_loader
+import schedule_store
+
+# ---------------------------------------------------------
+# 段階的なモデルの切り替え (安いモデルから試す)
+# まず一番安いモデルに聞き、回答が検証を通らなければ次の (大きい) モデルに聞き直す。
+# ほとんどの写真は簡単なので、安いモデルだけで済めば速くて安い。
+#
+#   AI_TIERED            1 で段階モード (既定), 0 で従来どおり先頭のモデルから
+#   AI_TIERS             安い順のモデル (カンマ区切り)
+#   AI_ESCALATE_ON       聞き直す条件 (カンマ区切り)
+#                          invalid_type   type_id が想定外
+#                          empty_name     identified_name が空
+#                          no_dictionary  辞書で名前を確認できない
+#   AI_TIER_MIN_MATCH    no_dictionary で「確認できた」とみなす類似度 (既定 0.8)
+# ---------------------------------------------------------
+TIERED = os.environ.get('AI_TIERED', '1') == '1'
+TIERS = [m.strip() for m in os.environ.get(
+    'AI_TIERS', 'gemini-flash-lite-latest,gemini-flash-latest,gemini-pro-latest'
+).split(',') if m.strip()]
+ESCALATE_ON = {r.strip() for r in os.environ.get(
+    'AI_ESCALATE_ON', 'invalid_type,empty_name,no_dictionary'
+).split(',') if r.strip()}
+MIN_MATCH = float(os.environ.get('AI_TIER_MIN_MATCH', 0.8))
+
+_lock = threading.Lock()
+_answered = Counter()      # 最終的に回答を採用したモデル
+_escalations = Counter()   # 聞き直した理由
+_requests = 0
+_escalated = 0            # 1回以上聞き直したリクエスト数
+
+
+def escalation_reason(ai_result, rules=None):
+    """回答を採用できない理由 (採用できるなら None)。rules を省略すると ESCALATE_ON で判定する"""
+    rules = ESCALATE_ON if rules is None else rules
+    if 'invalid_type' in rules:
+        # プロンプトで示した trash_types.id 以外は想定外 (種別を読めないときは確かめない)
+        valid_ids = schedule_store.type_ids()
+        try:
+            if valid_ids and int(ai_result.get('type_id')) not in valid_ids:
+                return 'invalid_type'
+        except (TypeError, ValueError):
+            return 'invalid_type'
+
+    name = str(ai_result.get('identified_name') or '').strip()
+    if 'empty_name' in rules and not name:
+        return 'empty_name'
+
+    if 'no_dictionary' in rules:
+        match = data_loader.match_dictionary(name, min_score=MIN_MATCH)
+        if not match or match["score"] < MIN_MATCH:
+            return 'no_dictionary'
+    return None
+
+
+def record(answered_by, reasons):
+    global _requests, _escalated
+    with _lock:
+        _requests += 1
+        if reasons:
+            _escalated += 1
+        _answered[answered_by] += 1
+        _escalations.update(reasons)
+
+
+def metrics():
+    with _lock:
+        return {
+            "enabled": TIERED,
+            "tiers": TIERS,
+            "escalate_on": sorted(ESCALATE_ON),
+            "requests": _requests,
+            "answered_by": dict(_answered),
+            "escalations": dict(_escalations),
+            "escalation_rate": round(_escalated / _requests, 3) if _requests else 0.0,
+        }
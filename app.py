@@ -1,18 +1,29 @@
-import io
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
-from models import db, Schedule, Area, TrashBin, TrashDictionary
+from models import db, Area, TrashBin, TrashDictionary
 import os
-from google import genai
-from PIL import Image
 from dotenv import load_dotenv
 import json
 import datetime
-import random
 import data_loader
+import schedule_store
+import response_cache
+import search_index
+import bin_index
+import bin_hours
+import bin_categories
+import bin_clusters
+import bin_tiles
+import gemini_pool
+import predictor
+import prediction_jobs
+import admission
+import rate_limiter
+import ai_tiers
+import idempotency
+import calendar
 from collections import defaultdict
-from sqlalchemy import or_
-import time
+from sqlalchemy.orm import joinedload
 
 
 
@@ -44,7 +55,11 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 CORS(app)
 db.init_app(app)
 
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+# AI判定の同時実行数の制限 (ワーカープロセスごと)
+predict_limiter = admission.AdmissionLimiter()
+
+# アプリが対応している言語コード
+SUPPORTED_LANGS = ['ja', 'en', 'zh', 'ko', 'vi', 'ru', 'id']
 
 
 def get_group_header(char):
@@ -90,28 +105,19 @@ def get_translated_value(item, field_base, lang):
 # サーバー起動時にCSVを読み込ませる
 with app.app_context():
     data_loader.load_data()
-
-# ------------------------------------------------------------------
-# ヘルパー関数 (ロジック系)
-# ------------------------------------------------------------------
-
-def get_next_collection_date(schedules):
-    """スケジュールリストから直近の日付を取得"""
-    if not schedules: return None
-    today = datetime.date.today()
-    future_dates = []
-    for s in schedules:
-        try:
-            check_date = s.date
-            if isinstance(check_date, str):
-                check_date = datetime.datetime.strptime(check_date, '%Y-%m-%d').date()
-            if check_date >= today:
-                future_dates.append(check_date)
-        except:
-            continue
-    if not future_dates: return None
-    return min(future_dates).strftime("%Y-%m-%d")
-
+    # スケジュールはDBから一度だけ読み込んでメモリに載せる (未seedなら初回リクエスト時に再試行)
+    try:
+        schedule_store.load_from_db()
+    except Exception as e:
+        print(f"✖ Schedule store not loaded yet: {e}")
+    try:
+        search_index.load_from_db()
+    except Exception as e:
+        print(f"✖ Search index not loaded yet: {e}")
+    try:
+        bin_index.load_from_db()
+    except Exception as e:
+        print(f"✖ Bin index not loaded yet: {e}")
 
 # ------------------------------------------------------------------
 # 2. ルート設定 (Routes)
@@ -131,29 +137,58 @@ def serve_static(path):
         # 存在しない場合は index.html を返す（Flutterの画面遷移対策）
         return send_from_directory(app.static_folder, 'index.html')
 
-# 機能A: カレンダー
+# 機能A: カレンダー (メモリ上のスケジュール配列から返す)
 @app.route('/api/schedules', methods=['GET'])
 def get_schedules():
+    # アプリは area_id を送ってくるので area と両対応にする
+    area_id = request.args.get('area_id', type=int) or request.args.get('area', type=int)
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
-    area_id = request.args.get('area', type=int)
-    lang = request.args.get('lang', 'ja') 
+    lang = request.args.get('lang', 'ja')
+
+    if not area_id or not year:
+        return jsonify({"error": "area_id and year are required"}), 400
+    if month and not 1 <= month <= 12:
+        return jsonify({"error": "month must be 1-12"}), 400
 
-    if not year or not month or not area_id:
-        return jsonify({"error": "year, month, and area are required"}), 400
+    schedule_store.ensure_loaded()
 
-    schedules = Schedule.query.filter_by(
-        area_id=area_id,
-        year=year,
-        month=month
-    ).all()
+    if month:
+        # 年と月がある場合 (その月の1日〜末日)
+        _, last_day = calendar.monthrange(year, month)
+        start_date = datetime.date(year, month, 1)
+        end_date = datetime.date(year, month, last_day)
+    else:
+        # 年だけの場合 (1月1日〜12月31日)
+        start_date = datetime.date(year, 1, 1)
+        end_date = datetime.date(year, 12, 31)
 
     result = []
-    for s in schedules:
-        type_name = get_translated_value(s.trash_type, 'name', lang)
+    for date, type_id in schedule_store.get_range(area_id, start_date, end_date):
         result.append({
-            "date": s.date.strftime('%Y-%m-%d'),
-            "type": type_name,
+            "date": date.strftime('%Y-%m-%d'),
+            "trash_type_id": type_id,  # アプリの色分けに必須
+            "type": schedule_store.get_type_name(type_id, lang),
+        })
+    return jsonify(result)
+
+# 機能A-2: 次回収集日 (全ゴミ種別をまとめて返す)
+@app.route('/api/next_collections', methods=['GET'])
+def get_next_collections():
+    area_id = request.args.get('area_id', type=int) or request.args.get('area', type=int)
+    lang = request.args.get('lang', 'ja')
+
+    if not area_id:
+        return jsonify({"error": "area_id is required"}), 400
+
+    schedule_store.ensure_loaded()
+
+    result = []
+    for type_id, date in sorted(schedule_store.get_next_dates(area_id).items(), key=lambda x: x[1]):
+        result.append({
+            "trash_type_id": type_id,
+            "type": schedule_store.get_type_name(type_id, lang),
+            "date": date.strftime('%Y-%m-%d'),
         })
     return jsonify(result)
 
@@ -164,8 +199,48 @@ def get_areas():
     # 簡易的に日本語名を返す（必要に応じて多言語化）
     return jsonify([{"id": a.id, "name": a.name_ja} for a in areas])
 
+def open_bins_filter():
+    """
+    open_now=1 / open_at=日時 (ISO形式) から、その時刻に開いている拠点の bool 配列を作る。
+    どちらもなければ None。include_unknown=1 なら時間が分からない拠点も含める。
+    戻り値は (bool 配列 または None, エラーのレスポンス または None)
+    """
+    if request.args.get('open_at'):
+        at = bin_hours.parse_datetime(request.args['open_at'])
+        if at is None:
+            return None, (jsonify({"error": "open_at must be an ISO 8601 datetime"}), 400)
+    elif request.args.get('open_now') == '1':
+        at = bin_hours.now()
+    else:
+        return None, None
+
+    bin_index.ensure_loaded()
+    mask = bin_hours.open_mask(at, include_unknown=request.args.get('include_unknown') == '1')
+    return bin_hours.to_array(mask), None
+
+
 @app.route('/api/trash_bins', methods=['GET']) # URLも確認！
 def get_trash_bins():
+    # open_now=1 または open_at=日時 を付けると、その時刻に利用できる拠点だけにする
+    selected, error = open_bins_filter()
+    if error:
+        return error
+
+    # bbox=西経度,南緯度,東経度,北緯度 (と zoom) を付けると、画面内の点だけを返す。
+    # zoom が低いときは近い拠点をまとめたクラスタ (cluster: true, count, lat, lon) になる
+    if request.args.get('bbox'):
+        try:
+            bbox = [float(v) for v in request.args['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            return jsonify({"error": "bbox must be west,south,east,north"}), 400
+        zoom = request.args.get('zoom', bin_clusters.MAX_ZOOM + 1, type=float)
+        return jsonify(bin_clusters.query(bbox, zoom, selected=selected))
+
+    if selected is not None:
+        return jsonify(bin_index.rows_in(selected))
+
     bins = TrashBin.query.all()
     results = []
     for b in bins:
@@ -183,11 +258,85 @@ def get_trash_bins():
         })
     return jsonify(results)
 
-# 機能D: 分別辞書
+# 機能C-2: 現在地の近くのゴミ箱 (近い順に k 件。radius_m を付けるとその距離以内だけ)
+@app.route('/api/trash_bins/nearby', methods=['GET'])
+def get_nearby_trash_bins():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    k = min(max(request.args.get('k', 20, type=int), 1), 100)
+    radius_m = request.args.get('radius_m', type=float)
+    selected, error = open_bins_filter()
+    if error:
+        return error
+
+    bin_index.ensure_loaded()
+    return jsonify(bin_index.nearby(lat, lon, k=k, radius_m=radius_m, selected=selected))
+
+# 機能C-2: 分別辞書の品目を出せる近くのゴミ箱 (辞書の品目 -> 対象品目のカテゴリ -> 近い順)
+@app.route('/api/trash_bins/for_item', methods=['GET'])
+def get_trash_bins_for_item():
+    dictionary_id = request.args.get('dictionary_id', type=int)
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if dictionary_id is None or lat is None or lon is None:
+        return jsonify({"error": "dictionary_id, lat and lon are required"}), 400
+    k = min(max(request.args.get('k', 20, type=int), 1), 100)
+    radius_m = request.args.get('radius_m', type=float)
+
+    item = db.session.get(TrashDictionary, dictionary_id)
+    if item is None:
+        return jsonify({"error": "Dictionary item not found"}), 404
+
+    selected, error = open_bins_filter()
+    if error:
+        return error
+
+    bin_index.ensure_loaded()
+    categories = bin_categories.item_categories(item.name_ja, item.note_ja)
+    bins = []
+    if categories:
+        accepts = bin_categories.selected(categories)
+        if selected is not None:
+            accepts &= selected
+        bins = bin_index.nearby(lat, lon, k=k, radius_m=radius_m, selected=accepts)
+
+    return jsonify({
+        "dictionary_id": item.id,
+        "name": item.name_ja,
+        "categories": categories,
+        "bins": bins,
+    })
+
+# 機能C-3: ゴミ箱の地図タイル (タイルごとのクラスタ / 拠点。作ったタイルはメモリとディスクに置いて使い回す)
+@app.route('/tiles/bins/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@app.route('/tiles/bins/<int:z>/<int:x>/<int:y>.json', methods=['GET'])
+def get_bin_tile(z, x, y):
+    if not bin_tiles.is_valid(z, x, y):
+        return jsonify({"error": "Invalid tile"}), 404
+    entry = bin_tiles.get_tile(z, x, y)
+    return response_cache.make_response(entry, cache_control=f"public, max-age={bin_tiles.MAX_AGE}")
+
+# 機能D: 分別辞書 (言語ごとに一度だけ組み立て、圧縮済みバイト列を ETag 付きで返す)
 @app.route('/api/trash_dictionary', methods=['GET'])
 def get_trash_dictionary():
     lang = request.args.get('lang', 'ja')
-    items = TrashDictionary.query.order_by(TrashDictionary.name_kana.asc()).all()
+    if lang not in SUPPORTED_LANGS:
+        return jsonify(build_trash_dictionary(lang))
+
+    entry = response_cache.get_or_build(
+        ('trash_dictionary', lang), lambda: build_trash_dictionary(lang)
+    )
+    return response_cache.make_response(entry)
+
+
+def build_trash_dictionary(lang):
+    """辞書全件を読み仮名・頭文字ごとにグループ化したリストを作る"""
+    # trash_type は一括で読み込む (1件ずつの遅延ロードを避ける)
+    items = TrashDictionary.query.options(
+        joinedload(TrashDictionary.trash_type)
+    ).order_by(TrashDictionary.name_kana.asc()).all()
     grouped_data = defaultdict(list)
 
     for item in items:
@@ -236,251 +385,212 @@ def get_trash_dictionary():
             items_list.sort(key=lambda x: x['name'].upper())
         result.append({'header': header, 'items': items_list})
 
-    return jsonify(result)
+    return result
 
 
-# 機能E: 検索 (スケジュール表示対応版)
+# 機能E: 検索 (メモリ上の前方一致インデックスで検索。DBには問い合わせない)
 @app.route('/api/trash_search', methods=['GET'])
 def trash_search():
     query_str = request.args.get('q', '').strip()
-    cat_id = request.args.get('cat_id')
+    cat_id = request.args.get('cat_id', type=int)
     lang = request.args.get('lang', 'ja')
 
-    base_query = TrashDictionary.query
+    search_index.ensure_loaded()
+    result = search_index.search(query_str, lang=lang, cat_id=cat_id, limit=50)
+    return jsonify(result)
+
+
+
+# AIモデルの状態 (サーキットブレーカー・同時実行数・待ち行列)
+@app.route('/api/ai_status', methods=['GET'])
+def get_ai_status():
+    return jsonify({
+        "models": [gemini_pool.get_breaker(m).to_dict()
+                   for m in dict.fromkeys(predictor.AI_MODELS + ai_tiers.TIERS)],
+        "admission": predict_limiter.metrics(),
+        "job_queue_depth": prediction_jobs.queue_depth(),
+        "rate_limits": rate_limiter.status(),
+        "tiers": ai_tiers.metrics(),
+        "idempotency": idempotency.metrics(),
+    })
+
+
+# 機能F: AI判定 (モデル切り替え & プロンプト強化版)
+# async=1 (または Prefer: respond-async) のときはジョブIDだけ返し、結果は /api/predict_jobs で受け取る
+@app.route('/api/predict_trash', methods=['POST'])
+def predict_trash():
+    if 'image' not in request.files:
+        return jsonify({"error": "No image part"}), 400
+    
+    file = request.files['image']
+    area_id = request.form.get('area_id')
+    user_lang = request.form.get('lang', 'ja')
+    raw = file.read()
+
+    # 同じ要求の送り直しは、実行中なら結果を待ち、終わっていれば同じ結果を返す
+    content_hash = idempotency.fingerprint(raw, area_id, user_lang)
+    idempotency_key = request.headers.get('Idempotency-Key')
+
+    if is_async_request():
+        try:
+            job, replayed = idempotency.run(
+                idempotency.request_key('predict_async', idempotency_key, content_hash), content_hash,
+                lambda: prediction_jobs.submit(run_prediction, raw, area_id, user_lang),
+                # エラーで終わったジョブは返し直さず、送り直しを新しいジョブにする
+                is_failed=lambda job: job.status == 'error'
+            )
+        except prediction_jobs.QueueFull:
+            return jsonify({"error": "QUEUE_FULL", "message": "Too many predictions in progress"}), 503, {"Retry-After": "5"}
+        except idempotency.KeyReused as e:
+            return jsonify({"error": "IDEMPOTENCY_KEY_REUSED", "message": str(e)}), 422
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/predict_jobs/{job.id}",
+        }), 202, {"Location": f"/api/predict_jobs/{job.id}", **replay_headers(replayed)}
 
-    if cat_id:
-        base_query = base_query.filter(
-            TrashDictionary.trash_type_id == cat_id
+    # 混んでいるときは待たせ続けず、すぐに 503 + Retry-After を返す
+    try:
+        result, replayed = idempotency.run(
+            idempotency.request_key('predict', idempotency_key, content_hash), content_hash,
+            lambda: predict_with_admission(raw, area_id, user_lang)
         )
+        return jsonify(result), 200, replay_headers(replayed)
+    except idempotency.KeyReused as e:
+        return jsonify({"error": "IDEMPOTENCY_KEY_REUSED", "message": str(e)}), 422
+    except admission.Rejected as e:
+        return jsonify({
+            "error": "SERVER_BUSY",
+            "message": f"Too many predictions in progress ({e.reason})"
+        }), 503, {"Retry-After": str(e.retry_after)}
+    except predictor.PredictionError as e:
+        return jsonify(e.payload), e.status, e.headers
 
-    if query_str:
-        search_term = f"{query_str}%"   # ★前方一致
 
-        filters = []
+def predict_with_admission(raw, area_id, user_lang):
+    with predict_limiter:
+        return predictor.predict(raw, area_id, user_lang)
 
-        if hasattr(TrashDictionary, 'name_ja'):
-            filters.append(TrashDictionary.name_ja.ilike(search_term))
 
-        if hasattr(TrashDictionary, 'name_kana'):
-            filters.append(TrashDictionary.name_kana.ilike(search_term))
+def replay_headers(replayed):
+    return {"Idempotent-Replayed": "true"} if replayed else {}
 
-        target_col = f"name_{lang}"
-        if lang == 'zh':
-            target_col = "name_zh_cn"
 
-        if hasattr(TrashDictionary, target_col):
-            filters.append(getattr(TrashDictionary, target_col).ilike(search_term))
+def is_async_request():
+    flag = request.form.get('async') or request.args.get('async')
+    if flag in ('1', 'true'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
 
-        if filters:
-            base_query = base_query.filter(or_(*filters))
 
-    items = base_query.order_by(
-        TrashDictionary.name_kana.asc()
-    ).limit(50).all()
+def run_prediction(raw, area_id, user_lang):
+    """バックグラウンドのスレッドで判定する (DBを読むことがあるのでアプリコンテキストを作る)"""
+    with app.app_context():
+        return predictor.predict(raw, area_id, user_lang)
 
-    result = []
 
-    for item in items:
-        name_val = get_translated_value(item, 'name', lang)
-        note_val = get_translated_value(item, 'note', lang)
+# 機能F-2: 非同期AI判定の結果 (wait=秒 を付けると、終わるまで最大その秒数だけ待つ)
+# ※ジョブはプロセス内に保持するので、複数ワーカーの場合は同じワーカーに届く必要がある
+@app.route('/api/predict_jobs/<job_id>', methods=['GET'])
+def get_predict_job(job_id):
+    job = prediction_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
 
-        type_name = ""
-        if item.trash_type:
-            type_name = get_translated_value(item.trash_type, 'name', lang)
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0:
+        job.wait(wait)
 
-        result.append({
-            "id": item.id,
-            "name": name_val,
-            "type": type_name,
-            "note": note_val,
-            "trash_type_id": item.trash_type_id,
-        })
+    if job.status == 'error':
+        return jsonify(job.to_dict()), job.error[0]
+    return jsonify(job.to_dict())
 
-    if lang != 'ja':
-        result.sort(key=lambda x: x['name'].upper())
 
-    return jsonify(result)
+# 機能F-2c: 複数画像 (または1枚に写った複数の品物) をまとめてAI判定
+# images に複数の画像を付けて送る。AIの呼び出しは1回で、品物ごとの結果を items で返す
+@app.route('/api/predict_trash/batch', methods=['POST'])
+def predict_trash_batch():
+    raws = [f.read() for f in request.files.getlist('images') + request.files.getlist('image')]
+    area_id = request.form.get('area_id')
+    user_lang = request.form.get('lang', 'ja')
 
+    try:
+        with predict_limiter:
+            return jsonify(predictor.predict_batch(raws, area_id, user_lang))
+    except admission.Rejected as e:
+        return jsonify({
+            "error": "SERVER_BUSY",
+            "message": f"Too many predictions in progress ({e.reason})"
+        }), 503, {"Retry-After": str(e.retry_after)}
+    except predictor.PredictionError as e:
+        return jsonify(e.payload), e.status, e.headers
 
 
-# 機能F: AI判定 (モデル切り替え & プロンプト強化版)
-@app.route('/api/predict_trash', methods=['POST'])
-def predict_trash():
+# 機能F-2b: AI判定のストリーミング版 (Server-Sent Events)
+# AIの回答を読み終わる前に名前と分別を partial で送り、辞書での上書き・収集日を後から送る
+@app.route('/api/predict_trash/stream', methods=['POST'])
+def predict_trash_stream():
     if 'image' not in request.files:
         return jsonify({"error": "No image part"}), 400
-    
-    file = request.files['image']
+
+    raw = request.files['image'].read()
     area_id = request.form.get('area_id')
     user_lang = request.form.get('lang', 'ja')
-    trash_type_map = data_loader.get_trash_type_map()
 
+    def generate():
+        # ストリームを送り終わるまで同時実行数の枠を持ち続ける
+        with predict_limiter:
+            yield from predictor.predict_stream(raw, area_id, user_lang)
+
+    # 最初のイベントまでに失敗したら、通常のエラーレスポンスで返す
+    events = generate()
     try:
-        img = Image.open(file.stream)
-    except Exception as e:
-        return jsonify({"error": "Invalid image file"}), 400
+        first = next(events)
+    except admission.Rejected as e:
+        return jsonify({
+            "error": "SERVER_BUSY",
+            "message": f"Too many predictions in progress ({e.reason})"
+        }), 503, {"Retry-After": str(e.retry_after)}
+    except predictor.PredictionError as e:
+        return jsonify(e.payload), e.status, e.headers
 
-    # ---------------------------------------------------------
-    # 2. Gemini AI による解析
-    # ---------------------------------------------------------
-    
-    models_to_try = ["gemini-flash-latest", "gemini-flash-lite-latest", "gemini-pro-latest"]
-    
-    ai_result = {}
-    success_model = None
-    last_error = None
-    
-    # 言語設定のマッピング
-    lang_map = { 
-        'ja': 'Japanese', 
-        'en': 'English', 
-        'zh': 'Simplified Chinese', 
-        'ko': 'Korean', 
-        'vi': 'Vietnamese',
-        'ru': 'Russian',
-        'id': 'Indonesian',
-    }
-    target_language = lang_map.get(user_lang, 'Japanese')
-
-    # ★修正: プロンプトを強化して、指定言語での出力を強制する
-    prompt = f"""
-    Analyze this image and identify the trash item for waste sorting in Sapporo, Japan.
-    
-    Target Language: {target_language} (All text values MUST be in this language)
-
-    Task 1: Identify the object name specifically in {target_language}.
-    Task 2: Classify into one of these types: 
-        - Burnable (燃やせるゴミ)
-        - Spray Can (スプレー缶)
-        - Non-burnable (燃やせないゴミ)
-        - Lighter (ライター)
-        - Bottle/Cans/PET (びん・缶・ペットボトル)
-        - Battery (電池)
-        - Plastic Containers (容器包装プラスチック)
-        - Mixed Paper (雑がみ)
-        - Branches/Leaves (枝・葉・草)
-        - Oversized (大型ごみ)
-    Task 3: Provide a short reason for the classification in {target_language}.
-
-    Return ONLY a valid JSON object with these exact keys:
-    {{
-      "identified_name": "Name of the object in {target_language}",
-      "type_id": "Integer from 1 to 7 (1:Burnable, 2:Non-burnable, 3:Bottles/Cans/PET, 4:Plastic, 5:Mixed Paper, 6:Branches, 7:Oversized)",
-      "type_name": "Name of the trash type in {target_language}",
-      "reason": "Reason in {target_language}"
-    }}
-    """
+    def stream():
+        try:
+            yield format_sse(*first)
+            for event in events:
+                yield format_sse(*event)
+        except predictor.PredictionError as e:
+            yield format_sse('error', e.payload)
+        finally:
+            events.close()
 
-    client = genai.Client(api_key=GEMINI_API_KEY)
-
-    for model_name in models_to_try:
-        for attempt in range(2):
-            try:
-                print(f"DEBUG: Trying AI Model -> {model_name} (Attempt {attempt+1})")
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=[img, prompt],
-                    # JSONモードを強制する設定（モデルによっては効かない場合もあるが念のため）
-                    config={'response_mime_type': 'application/json'} 
-                )
-                
-                # マークダウンの削除処理
-                response_text = response.text.replace('```json', '').replace('```', '').strip()
-                ai_result = json.loads(response_text)
-                
-                success_model = model_name
-                break 
-            
-            except Exception as e:
-                error_msg = str(e)
-                print(f"WARNING: {model_name} failed: {error_msg}")
-                last_error = e
-                if "503" in error_msg or "UNAVAILABLE" in error_msg:
-                    time.sleep(2)
-                    continue 
-                else:
-                    break 
-        
-        if success_model:
-            break
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# 機能F-3: 品名 (テキスト) でのAI判定
+# 辞書で見つかればAIを呼ばず、見つからないときだけテキストでAIに聞く (画像より速くて安い)
+@app.route('/api/classify_text', methods=['GET'])
+def classify_text():
+    query_str = request.args.get('q', '').strip()
+    area_id = request.args.get('area_id')
+    user_lang = request.args.get('lang', 'ja')
+    if not query_str:
+        return jsonify({"error": "q is required"}), 400
 
-    if success_model is None:
-        print(f"AI All Models Failed: {last_error}")
+    try:
+        return jsonify(predictor.classify_text(query_str, area_id, user_lang, limiter=predict_limiter))
+    except admission.Rejected as e:
         return jsonify({
-            "error": "AI_LIMIT_OR_ERROR",
-            "message": str(last_error)
-        }), 503
-
-    # ---------------------------------------------------------
-    # 3. 結果の整形
-    # ---------------------------------------------------------
-    final_name = ""
-    final_type_id = 1
-    final_type_name = ""
-    final_reason = ""
-    is_dictionary_match = False
-
-    # AIの結果を初期値としてセット
-    final_name = ai_result.get('identified_name', 'Unknown')
-    final_type_id = int(ai_result.get('type_id', 1))
-    final_type_name = ai_result.get('type_name', 'Unknown')
-    final_reason = ai_result.get('reason', '')
-
-    # 辞書検索（AIが出した名前を使って辞書にあるか確認）
-    # ※辞書にあれば、より正確な公式情報で上書きする
-    dict_match = data_loader.find_in_dictionary(final_name)
-    
-    if dict_match:
-        is_dictionary_match = True
-        name_col = f"name_{user_lang}" if user_lang != 'zh' else 'name_zh_cn'
-        # 辞書にその言語の名前があれば上書き、なければ英語、それもなければAIの結果を維持
-        dict_name = dict_match.get(name_col) or dict_match.get('name_en')
-        if dict_name:
-            final_name = dict_name
-
-        trash_str = dict_match.get('trash_type_str', '')
-        if trash_str:
-             # ここも翻訳したいが、辞書データ構造による。一旦AIの翻訳済みtype_nameを優先するか検討。
-             # 今回は「辞書の分別ID」を正として、表示名はAIの結果（翻訳済み）を使うか、
-             # フロントエンド側でIDから翻訳するほうが確実。
-             # ここでは簡易的に、辞書のIDを採用し、名前はAIのものを維持（または辞書に翻訳があればそれを使う）
-             pass
-
-        # IDのマッピング更新
-        for key, val in trash_type_map.items():
-            if key in trash_str:
-                final_type_id = val
-                break
-        
-        note_col = 'note_ja' if user_lang == 'ja' else 'note_en'
-        dict_note = dict_match.get(note_col)
-        if dict_note:
-            final_reason = dict_note # 辞書の備考があれば理由として上書き
-
-    # スケジュール計算
-    schedule_date = None
-    if area_id and final_type_id:
-        try:
-            area_id_int = int(area_id)
-            schedules = Schedule.query.filter_by(
-                area_id=area_id_int, 
-                trash_type_id=final_type_id
-            ).all()
-            if schedules:
-                schedule_date = get_next_collection_date(schedules)
-        except:
-            pass
-
-    # JSONのキー名はフロントエンド(camera_screen.dart)に合わせて返す
-    return jsonify({
-        "name": final_name,
-        "type_id": final_type_id,
-        "type": final_type_name, 
-        "reason": final_reason,
-        "confidence": 0.99 if is_dictionary_match else 0.85,
-        "collection_schedule": schedule_date,
-        "is_dictionary_match": is_dictionary_match,
-        "model_used": success_model
-    })
+            "error": "SERVER_BUSY",
+            "message": f"Too many predictions in progress ({e.reason})"
+        }), 503, {"Retry-After": str(e.retry_after)}
+    except predictor.PredictionError as e:
+        return jsonify(e.payload), e.status, e.headers
 
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+import re
+import unicodedata
+
+import numpy as np
+
+# ---------------------------------------------------------
+# ゴミ箱 (回収拠点) の対象品目の転置インデックス
+# 対象品目 (例: 「古紙・リターナブルびん」) を品目カテゴリに分け、
+# カテゴリ -> そのカテゴリを受け付ける拠点の行番号 (bin_index と同じ順番) を持つ。
+#
+# 分別辞書の品目は、備考の「〇〇の無料回収に出すと資源に！」と品目名から
+# 同じカテゴリに変換するので、「この品目を出せる一番近い拠点」を1回で探せる。
+# ---------------------------------------------------------
+
+# 表記の揺れ -> カテゴリ名 (カテゴリ名は CSV の対象品目の書き方に合わせる)
+ALIASES = {
+    "使用済み食用油": "使用済み食用油",
+    "使用済食用油": "使用済み食用油",
+    "廃食油": "使用済み食用油",
+    "家庭用廃食油": "使用済み食用油",
+    "古紙": "古紙",
+    "新聞": "古紙",
+    "雑誌": "古紙",
+    "ダンボール": "古紙",
+    "段ボール": "古紙",
+    "リターナブルびん": "リターナブルびん",
+    "リユースびん": "リターナブルびん",
+    "蛍光管": "蛍光管",
+    "蛍光灯": "蛍光管",
+    "古着": "古着",
+    "小型家電": "小型家電",
+}
+
+_SEPARATORS = re.compile(r"[・、,/／\s]+")
+_PARENTHESES = re.compile(r"\([^)]*\)")
+_FREE_COLLECTION = re.compile(r"([^\s・、。!／/「」]+)の無料回収")
+
+_postings = {}   # カテゴリ -> 行番号の配列 (昇順)
+_count = 0
+
+
+def normalize(text):
+    """全角/半角をそろえ、かっこ書きを取り除く"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return _PARENTHESES.sub('', text).strip()
+
+
+def to_category(token):
+    """1つの語をカテゴリ名にする (知らない語はそのまま)"""
+    token = normalize(token)
+    return ALIASES.get(token, token)
+
+
+def tokenize(bin_type):
+    """対象品目の文字列をカテゴリ名の集合にする"""
+    return {to_category(token) for token in _SEPARATORS.split(normalize(bin_type)) if token}
+
+
+def build(bin_types):
+    """拠点の行番号順に並んだ対象品目の文字列から転置インデックスを作る"""
+    global _postings, _count
+
+    postings = {}
+    for i, bin_type in enumerate(bin_types):
+        for category in tokenize(bin_type):
+            postings.setdefault(category, []).append(i)
+    _postings = {category: np.array(rows, dtype=np.int64) for category, rows in postings.items()}
+    _count = len(bin_types)
+
+
+def categories():
+    """カテゴリ名 -> 拠点数"""
+    return {category: len(rows) for category, rows in sorted(_postings.items())}
+
+
+def item_categories(name_ja, note_ja):
+    """
+    分別辞書の品目 (名前と備考) を出せる拠点のカテゴリ。
+    備考の「〇〇の無料回収」と、品目名そのものがカテゴリ名のもの (例: 蛍光管) を使う。
+    """
+    found = {to_category(name_ja)}
+    found.update(to_category(phrase) for phrase in _FREE_COLLECTION.findall(normalize(note_ja)))
+    return sorted(category for category in found if category in _postings)
+
+
+def selected(category_list):
+    """いずれかのカテゴリを受け付ける拠点の bool 配列 (行番号ごと)"""
+    mask = np.zeros(_count, dtype=bool)
+    for category in category_list:
+        rows = _postings.get(category)
+        if rows is not None:
+            mask[rows] = True
+    return mask
@@ -0,0 +1,182 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import bin_index
+
+# ---------------------------------------------------------
+# 地図用のゴミ箱のクラスタ (supercluster と同じ考え方)
+# 一番細かいズームから順に、近い点 (半径 RADIUS_PX 以内) を重心と件数を持つ1つの点にまとめ、
+# その結果をさらに1段粗いズームでまとめる…を繰り返して、全ズームの段を一度に作る。
+# 作った段はデータの版 (bin_index.version) ごとに1回だけ計算して使い回す。
+# 開いている拠点だけのクラスタ (open_now など) は、絞り込みの結果ごとに少しだけ覚えておく
+# (結果が変わるのは15分の枠や日付が変わったときだけなので)。
+#
+#   BIN_CLUSTER_MAX_ZOOM   このズームより拡大したらクラスタにせず1件ずつ返す (既定 15)
+#   BIN_CLUSTER_RADIUS_PX  まとめる半径 (タイル 512px 上のピクセル, 既定 60)
+# ---------------------------------------------------------
+MAX_ZOOM = int(os.environ.get('BIN_CLUSTER_MAX_ZOOM', 15))
+RADIUS_PX = float(os.environ.get('BIN_CLUSTER_RADIUS_PX', 60))
+EXTENT = 512
+FILTERED_CACHE_SIZE = 8
+
+_lock = threading.Lock()
+_levels = {}          # ズーム -> _Level
+_levels_version = None
+_filtered = OrderedDict()   # (版, 選んだ拠点のビット列) -> ズーム -> _Level
+
+
+class _Level:
+    """1つのズームの点 (クラスタ または 1件の拠点)"""
+
+    def __init__(self, x, y, count, row):
+        self.x = x            # メルカトル座標 (0〜1)
+        self.y = y
+        self.count = count    # まとめた拠点の数
+        self.row = row        # 1件だけの点なら bin_index の行番号、クラスタなら -1
+
+
+def mercator_x(lon):
+    return np.asarray(lon) / 360.0 + 0.5
+
+
+def mercator_y(lat):
+    sin = np.sin(np.radians(np.asarray(lat)))
+    y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / math.pi
+    return np.clip(y, 0.0, 1.0)
+
+
+def to_lon(x):
+    return (np.asarray(x) - 0.5) * 360.0
+
+
+def to_lat(y):
+    y2 = (180.0 - np.asarray(y) * 360.0) * math.pi / 180.0
+    return 360.0 * np.arctan(np.exp(y2)) / math.pi - 90.0
+
+
+def _cluster(level, radius):
+    """1段細かい level の点を、半径 radius (メルカトル座標) 以内どうしでまとめる"""
+    n = len(level.x)
+    grid = {}
+    cx = np.floor(level.x / radius).astype(np.int64)
+    cy = np.floor(level.y / radius).astype(np.int64)
+    for i in range(n):
+        grid.setdefault((cx[i], cy[i]), []).append(i)
+
+    done = np.zeros(n, dtype=bool)
+    xs, ys, counts, rows = [], [], [], []
+    r2 = radius * radius
+    for i in range(n):
+        if done[i]:
+            continue
+        done[i] = True
+        members = [i]
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((cx[i] + dx, cy[i] + dy), ()):
+                    if not done[j] and (level.x[j] - level.x[i]) ** 2 + (level.y[j] - level.y[i]) ** 2 <= r2:
+                        done[j] = True
+                        members.append(j)
+
+        if len(members) == 1:
+            xs.append(level.x[i])
+            ys.append(level.y[i])
+            counts.append(level.count[i])
+            rows.append(level.row[i])
+            continue
+
+        # 件数で重み付けした重心を新しい点にする
+        weight = level.count[members]
+        total = weight.sum()
+        xs.append(float((level.x[members] * weight).sum() / total))
+        ys.append(float((level.y[members] * weight).sum() / total))
+        counts.append(int(total))
+        rows.append(-1)
+
+    return _Level(np.array(xs), np.array(ys), np.array(counts, dtype=np.int64), np.array(rows, dtype=np.int64))
+
+
+def build(selected=None):
+    """今のデータで全ズームの段を作る (selected を指定すると、True の拠点だけで作る)"""
+    lat, lon = bin_index.coordinates()
+    rows = np.arange(len(lat), dtype=np.int64)
+    if selected is not None:
+        rows = np.flatnonzero(selected)
+        lat, lon = lat[rows], lon[rows]
+    level = _Level(mercator_x(lon), mercator_y(lat), np.ones(len(rows), dtype=np.int64), rows)
+    levels = {MAX_ZOOM + 1: level}
+    for zoom in range(MAX_ZOOM, -1, -1):
+        level = _cluster(level, RADIUS_PX / (EXTENT * 2 ** zoom))
+        levels[zoom] = level
+    return levels
+
+
+def get_levels(selected=None):
+    """データの版が変わっていれば作り直し、全ズームの段を返す"""
+    global _levels, _levels_version
+    version = bin_index.version()
+    if selected is not None:
+        key = (version, np.packbits(selected).tobytes())
+        with _lock:
+            levels = _filtered.get(key)
+            if levels is None:
+                levels = _filtered[key] = build(selected)
+            _filtered.move_to_end(key)
+            while len(_filtered) > FILTERED_CACHE_SIZE:
+                _filtered.popitem(last=False)
+            return levels
+
+    with _lock:
+        if _levels_version != version:
+            _levels = build()
+            _levels_version = version
+            print(f"✔ Bin clusters: {len(_levels)} zoom levels (version {version}).")
+        return _levels
+
+
+def _node(level, i, rows):
+    if level.row[i] >= 0:
+        return {**rows[level.row[i]], "cluster": False}
+    return {
+        "cluster": True,
+        "count": int(level.count[i]),
+        "lat": round(float(to_lat(level.y[i])), 6),
+        "lon": round(float(to_lon(level.x[i])), 6),
+    }
+
+
+def _nodes_in(zoom, min_x, max_x, min_y, max_y, right_open=False, selected=None):
+    """そのズームの段で、メルカトル座標の範囲に入る点を返す"""
+    level = get_levels(selected)[min(max(int(math.floor(zoom)), 0), MAX_ZOOM + 1)]
+    if right_open:
+        # タイルの境界上の点が隣のタイルと重複しないよう、右端・下端は含めない
+        inside = (level.x >= min_x) & (level.x < max_x) & (level.y >= min_y) & (level.y < max_y)
+    else:
+        inside = (level.x >= min_x) & (level.x <= max_x) & (level.y >= min_y) & (level.y <= max_y)
+    rows = bin_index.all_rows()
+    return [_node(level, i, rows) for i in np.flatnonzero(inside)]
+
+
+def query(bbox, zoom, selected=None):
+    """
+    bbox (西経度, 南緯度, 東経度, 北緯度) の中にある点を返す。
+    zoom が MAX_ZOOM 以下ならクラスタ (cluster=True, count, lat, lon) と1件だけの拠点が混ざる。
+    selected (行番号ごとの bool 配列) を指定すると、True の拠点だけでまとめる。
+    西経度 > 東経度 なら日付変更線をまたぐ範囲とみなし、西経度〜180度 と -180度〜東経度 に分けて探す。
+    """
+    west, south, east, north = bbox
+    top, bottom = mercator_y(north), mercator_y(south)
+    if west > east:
+        return (_nodes_in(zoom, mercator_x(west), 1.0, top, bottom, selected=selected)
+                + _nodes_in(zoom, 0.0, mercator_x(east), top, bottom, selected=selected))
+    return _nodes_in(zoom, mercator_x(west), mercator_x(east), top, bottom, selected=selected)
+
+
+def query_tile(z, x, y):
+    """地図タイル z/x/y (slippy map の番号) の中にある点を返す"""
+    size = 1.0 / 2 ** z
+    return _nodes_in(z, x * size, (x + 1) * size, y * size, (y + 1) * size, right_open=True)
@@ -0,0 +1,348 @@
+import datetime
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# ---------------------------------------------------------
+# ゴミ箱 (回収拠点) の利用可能時間
+# CSV の 利用可能曜日 / 開始時間 / 終了時間 / 利用可能時間特記事項 を読み、
+# 拠点ごとに「1週間 x 15分単位 (7 x 96 ビット)」の利用可能時間と、
+# 利用できない日 (祝日・年末年始・お盆など) の集合に変換する。
+#
+# 判定は拠点をまたいだビット演算で行う。
+# 15分の枠ごとに「その枠に開いている拠点」のビット列 (拠点の行番号がビット位置) を持ち、
+# 「今開いている拠点」= 曜日と時刻の枠のビット列 AND NOT 今日休みの拠点のビット列 で求める。
+# 読めない書き方 (「1～3月の土曜」など) は無視し、時間の書いていない拠点は「不明」として扱う。
+#
+#   BIN_HOURS_TZ  拠点の時刻のタイムゾーン (既定 Asia/Tokyo。サーバーが UTC でも札幌の時刻で判定する)
+# ---------------------------------------------------------
+TIMEZONE = ZoneInfo(os.environ.get('BIN_HOURS_TZ', 'Asia/Tokyo'))
+SLOTS_PER_DAY = 96                 # 15分 x 96 = 24時間
+WEEKDAYS = "月火水木金土日"         # datetime.weekday() と同じ順番 (月曜 = 0)
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+FULL_WEEK = (1 << (7 * SLOTS_PER_DAY)) - 1
+
+# 期間の呼び方 -> (開始の月, 日, 終了の月, 日)。年末年始は札幌市の施設の休みに合わせる
+NAMED_PERIODS = {
+    "年末年始": (12, 29, 1, 4),
+    "正月": (1, 1, 1, 3),
+    "お盆": (8, 13, 8, 16),
+    "ゴールデンウィーク": (5, 3, 5, 5),
+}
+
+_TIME = r"(\d{1,2}):(\d{2})"
+_DAY_HOURS = re.compile(
+    r"((?:[月火水木金土日]曜日?|祝日|祝・休日)(?:、(?:[月火水木金土日]曜日?|祝日|祝・休日))*)"
+    r"の利用時間は" + _TIME + r"~" + _TIME
+)
+_HOLIDAY_UNTIL = re.compile(r"祝・?休?日は" + _TIME + r"まで")
+_CLOSED = re.compile(r"([^。]*?)(?:は利用不可|休み|は休館)")
+_DATE_RANGE = re.compile(r"(\d{1,2})(?:/|月)(\d{1,2})日?(?:~(\d{1,2})(?:/|月)(\d{1,2})日?)?")
+_MONTHLY_DAYS = re.compile(r"毎月([\d、,]+)日")
+_NTH_WEEKDAY = re.compile(r"(?:毎月)?第(\d)([月火水木金土日])曜日?")
+_HOUR_RANGE = re.compile(r"^(\d{1,2})~(\d{1,2})時$")
+_WEEKDAY_TOKEN = re.compile(r"^([月火水木金土日])曜日?$")
+_COMPACT_DAYS = re.compile(r"^([月火水木金土日]+)(祝日?)?$")
+
+
+class BinHours:
+    """1拠点の利用可能時間"""
+
+    def __init__(self):
+        self.known = False            # 時間が分かっているか (分からない拠点は絞り込みの対象外)
+        self.days = [0] * 7           # 曜日ごとの開いている15分枠 (96 ビットより上は翌日の枠)
+        self.holiday = None           # 祝日の 96 ビット (None なら曜日どおり、0 なら休み)
+        self.closed_dates = set()     # 毎年休みの (月, 日)
+        self.closed_monthly = set()   # 毎月休みの日
+        self.closed_nth = set()       # 休みの (第何, 曜日)
+
+    def week_mask(self):
+        """7 x 96 ビットを1つの整数にしたもの (ビット位置 = 曜日 x 96 + 枠)"""
+        mask = 0
+        for weekday, day in enumerate(self.days):
+            mask |= day << (weekday * SLOTS_PER_DAY)
+        # 日曜の夜から日付をまたぐ分は月曜の枠に戻す
+        return (mask & FULL_WEEK) | (mask >> (7 * SLOTS_PER_DAY))
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '')
+    return text.replace('〜', '~').replace('～', '~').strip()
+
+
+def parse_minutes(text):
+    m = re.search(_TIME, normalize(text))
+    if not m:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def slot_range(start, end):
+    """
+    開始〜終了 (分) の15分枠をビットにする。
+    終了が開始以前なら日付をまたぐとみなし、翌日の分は 96 ビットより上 (翌日の枠) に置く。
+    """
+    first = start // 15
+    last = -(-end // 15)             # 切り上げ (17:15 まで -> 17:00〜17:15 の枠を含む)
+    if end <= start:
+        last += SLOTS_PER_DAY
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+def daily_slots(slots):
+    """slot_range の結果を、毎日くり返す 96 ビットにする (翌日の分はその日の早い時間に重ねる)"""
+    return (slots & FULL_DAY) | (slots >> SLOTS_PER_DAY)
+
+
+def _expand_dates(m1, d1, m2, d2):
+    """毎年の (月, 日) の範囲を集合にする (12/29~1/4 のように年をまたいでもよい)"""
+    dates = set()
+    day = datetime.date(2000, m1, d1)   # うるう年なので 2/29 も含められる
+    end = datetime.date(2000 if (m2, d2) >= (m1, d1) else 2001, m2, d2)
+    while day <= end:
+        dates.add((day.month, day.day))
+        day += datetime.timedelta(days=1)
+    return dates
+
+
+def _apply_closed_token(hours, token):
+    """「〜は利用不可」の前に並んだ項目を1つずつ反映する (読めない項目は無視する)"""
+    token = re.sub(r"[(（][^)）]*[)）]", "", token).strip()
+    if not token:
+        return
+    if token in NAMED_PERIODS:
+        hours.closed_dates |= _expand_dates(*NAMED_PERIODS[token])
+        return
+    if token in ("祝日", "祝", "祝・休日", "休日"):
+        hours.holiday = 0
+        return
+
+    m = _WEEKDAY_TOKEN.match(token)
+    if m:
+        hours.days[WEEKDAYS.index(m.group(1))] = 0
+        return
+    m = _NTH_WEEKDAY.fullmatch(token)
+    if m:
+        hours.closed_nth.add((int(m.group(1)), WEEKDAYS.index(m.group(2))))
+        return
+    m = _HOUR_RANGE.match(token)
+    if m:
+        # 毎日の休み時間なので、その日の枠からも翌日にまたいだ枠からも除く
+        closed = daily_slots(slot_range(int(m.group(1)) * 60, int(m.group(2)) * 60))
+        hours.days = [day & ~(closed | closed << SLOTS_PER_DAY) for day in hours.days]
+        if hours.holiday:
+            hours.holiday &= ~closed
+        return
+    m = _COMPACT_DAYS.match(token)
+    if m:
+        # 「土日祝日」のように続けて書いたもの
+        for char in m.group(1):
+            hours.days[WEEKDAYS.index(char)] = 0
+        if m.group(2):
+            hours.holiday = 0
+        return
+    m = _DATE_RANGE.fullmatch(token)
+    if m:
+        m1, d1, m2, d2 = m.groups()
+        if m2:
+            hours.closed_dates |= _expand_dates(int(m1), int(d1), int(m2), int(d2))
+        else:
+            hours.closed_dates.add((int(m1), int(d1)))
+
+
+def parse(days_text, start_text, end_text, note_text):
+    """CSV の4列から BinHours を作る"""
+    hours = BinHours()
+    note = normalize(note_text)
+    if note == 'なし':
+        note = ''
+
+    start, end = parse_minutes(start_text), parse_minutes(end_text)
+    days_text = normalize(days_text)
+    if re.fullmatch(r"[月火水木金土日]+", days_text):
+        open_days = days_text
+    else:
+        open_days = WEEKDAYS          # 「なし」「店舗の営業日」などは曜日の指定なしとみなす
+
+    if '24時間' in note or '終日利用可' in note:
+        daily = FULL_DAY
+    elif start is not None and end is not None:
+        daily = slot_range(start, end)
+    else:
+        return hours                  # 時間が分からない
+    hours.known = True
+    hours.days = [daily if WEEKDAYS[i] in open_days else 0 for i in range(7)]
+
+    # 曜日・祝日ごとの利用時間 (例: 日曜、祝日の利用時間は08:00~20:00)
+    for m in _DAY_HOURS.finditer(note):
+        special = slot_range(int(m.group(2)) * 60 + int(m.group(3)), int(m.group(4)) * 60 + int(m.group(5)))
+        for name in m.group(1).split('、'):
+            if name[0] in WEEKDAYS:
+                hours.days[WEEKDAYS.index(name[0])] = special
+            else:
+                hours.holiday = special & FULL_DAY   # 祝日はその日の分だけ
+    m = _HOLIDAY_UNTIL.search(note)
+    if m and start is not None:
+        hours.holiday = slot_range(start, int(m.group(1)) * 60 + int(m.group(2))) & FULL_DAY
+
+    for sentence in note.split('。'):
+        if '午後' in sentence or '午前' in sentence or '要問合せ' in sentence:
+            continue                  # 半日だけの休みは、上の利用時間の指定で表している
+        for monthly in _MONTHLY_DAYS.finditer(sentence):
+            hours.closed_monthly |= {int(d) for d in re.split(r"[、,]", monthly.group(1)) if d}
+        sentence = _MONTHLY_DAYS.sub('', sentence)
+        for m in _CLOSED.finditer(sentence):
+            for token in m.group(1).split('、'):
+                _apply_closed_token(hours, token)
+    return hours
+
+
+# ---------------------------------------------------------
+# 日本の祝日 (内閣府の規則: 固定日・ハッピーマンデー・春分/秋分・振替休日・国民の休日)
+# ---------------------------------------------------------
+
+def _nth_monday(year, month, n):
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+@lru_cache(maxsize=16)
+def holidays(year):
+    """その年の祝日 (振替休日・国民の休日を含む) の集合"""
+    offset = 0.242194 * (year - 1980) - (year - 1980) // 4
+    days = {
+        datetime.date(year, 1, 1),
+        _nth_monday(year, 1, 2),                                   # 成人の日
+        datetime.date(year, 2, 11),
+        datetime.date(year, 2, 23),                                # 天皇誕生日
+        datetime.date(year, 3, int(20.8431 + offset)),             # 春分の日
+        datetime.date(year, 4, 29),
+        datetime.date(year, 5, 3),
+        datetime.date(year, 5, 4),
+        datetime.date(year, 5, 5),
+        _nth_monday(year, 7, 3),                                   # 海の日
+        datetime.date(year, 8, 11),                                # 山の日
+        _nth_monday(year, 9, 3),                                   # 敬老の日
+        datetime.date(year, 9, int(23.2488 + offset)),             # 秋分の日
+        _nth_monday(year, 10, 2),                                  # スポーツの日
+        datetime.date(year, 11, 3),
+        datetime.date(year, 11, 23),
+    }
+    # 国民の休日: 祝日にはさまれた平日
+    for day in sorted(days):
+        between = day + datetime.timedelta(days=1)
+        if between + datetime.timedelta(days=1) in days and between not in days and between.weekday() != 6:
+            days.add(between)
+    # 振替休日: 日曜の祝日の後の、最初の祝日でない日
+    for day in sorted(days):
+        if day.weekday() == 6:
+            substitute = day + datetime.timedelta(days=1)
+            while substitute in days:
+                substitute += datetime.timedelta(days=1)
+            days.add(substitute)
+    return frozenset(days)
+
+
+def is_holiday(day):
+    return day in holidays(day.year)
+
+
+# ---------------------------------------------------------
+# 全拠点のビット列 (拠点の行番号 = ビット位置)
+# ---------------------------------------------------------
+_week_slots = [0] * (7 * SLOTS_PER_DAY)   # 曜日 x 96 + 枠 -> その枠に開いている拠点
+_holiday_slots = [0] * SLOTS_PER_DAY      # 枠 -> 祝日のその枠に開いている拠点 (祝日の指定がある拠点のみ)
+_holiday_override = 0    # 祝日の指定がある拠点
+_closed_dates = {}       # (月, 日) -> その日休みの拠点
+_closed_monthly = {}     # 日 -> 毎月その日休みの拠点
+_closed_nth = {}         # (第何, 曜日) -> 休みの拠点
+_unknown = 0             # 時間が分からない拠点
+_count = 0
+
+
+def build(hours_list):
+    """拠点の行番号順に並んだ BinHours のリストからビット列を作る"""
+    global _week_slots, _holiday_slots, _holiday_override
+    global _closed_dates, _closed_monthly, _closed_nth, _unknown, _count
+
+    week_slots = [0] * (7 * SLOTS_PER_DAY)
+    holiday_slots = [0] * SLOTS_PER_DAY
+    holiday_override = 0
+    closed_dates, closed_monthly, closed_nth = {}, {}, {}
+    unknown = 0
+
+    for i, hours in enumerate(hours_list):
+        bit = 1 << i
+        if not hours.known:
+            unknown |= bit
+            continue
+        week = hours.week_mask()
+        while week:
+            low = week & -week
+            week_slots[low.bit_length() - 1] |= bit
+            week ^= low
+        if hours.holiday is not None:
+            holiday_override |= bit
+            for slot in range(SLOTS_PER_DAY):
+                if hours.holiday >> slot & 1:
+                    holiday_slots[slot] |= bit
+        for key in hours.closed_dates:
+            closed_dates[key] = closed_dates.get(key, 0) | bit
+        for key in hours.closed_monthly:
+            closed_monthly[key] = closed_monthly.get(key, 0) | bit
+        for key in hours.closed_nth:
+            closed_nth[key] = closed_nth.get(key, 0) | bit
+
+    _week_slots, _holiday_slots, _holiday_override = week_slots, holiday_slots, holiday_override
+    _closed_dates, _closed_monthly, _closed_nth = closed_dates, closed_monthly, closed_nth
+    _unknown, _count = unknown, len(hours_list)
+
+
+def open_mask(at, include_unknown=False):
+    """日時 at に開いている拠点のビット列 (include_unknown なら時間が分からない拠点も含める)"""
+    day = at.date()
+    slot = at.hour * 4 + at.minute // 15
+    weekday = day.weekday()
+
+    opened = _week_slots[weekday * SLOTS_PER_DAY + slot]
+    if is_holiday(day):
+        # 祝日の指定がある拠点は、曜日の時間の代わりに祝日の時間を使う
+        opened = (opened & ~_holiday_override) | _holiday_slots[slot]
+
+    closed = (_closed_dates.get((day.month, day.day), 0)
+              | _closed_monthly.get(day.day, 0)
+              | _closed_nth.get(((day.day - 1) // 7 + 1, weekday), 0))
+    opened &= ~closed
+    if include_unknown:
+        opened |= _unknown
+    return opened
+
+
+def now():
+    """拠点のタイムゾーンでの現在時刻"""
+    return datetime.datetime.now(TIMEZONE)
+
+
+def parse_datetime(text):
+    """ISO 形式の日時を読む。タイムゾーンなしは拠点の時刻、ありは拠点の時刻に直す (読めなければ None)"""
+    try:
+        at = datetime.datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    if at.tzinfo is not None:
+        at = at.astimezone(TIMEZONE)
+    return at
+
+
+def to_array(mask):
+    """拠点のビット列を、行番号ごとの bool 配列 (NumPy) にする"""
+    data = np.frombuffer(mask.to_bytes((_count + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(data, bitorder='little')[:_count].astype(bool)
+
+
+def count():
+    return _count
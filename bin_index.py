@@ -0,0 +1,205 @@
+import hashlib
+import json
+import math
+
+import numpy as np
+
+import bin_categories
+import bin_hours
+from models import TrashBin
+
+# ---------------------------------------------------------
+# ゴミ箱 (回収拠点) の空間インデックス (メモリ常駐)
+# 緯度経度を一定の大きさのマス目 (グリッド) に分けて、マスごとに拠点の番号を持つ。
+# 近くの拠点は、現在地のマスから外側へ1周ずつ広げながら集め、
+# 距離 (haversine) は NumPy でまとめて計算する。
+# 利用可能時間 (bin_hours) と対象品目 (bin_categories) も同じ行番号の順番で作るので、
+# 開いている拠点や、ある品目を受け付ける拠点だけに絞り込める。
+# ---------------------------------------------------------
+CELL_DEG = 0.01            # マスの大きさ (度)。札幌では 南北 約1.1km x 東西 約0.8km
+FAR_RINGS = 10             # 拠点のある範囲からこれ以上離れた地点は全件で計算する
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEG = math.pi * EARTH_RADIUS_M / 180
+
+_rows = []                 # 拠点1件ごとの dict (/api/trash_bins と同じ形)
+_lat = np.empty(0)         # 緯度 (ラジアン)
+_lon = np.empty(0)         # 経度 (ラジアン)
+_cells = {}                # (緯度のマス, 経度のマス) -> 行番号の配列
+_cell_range = (0, 0, 0, 0) # マスの範囲 (緯度の最小, 最大, 経度の最小, 最大)
+_version = ""              # データの版 (拠点の内容のハッシュ)。クラスタやタイルのキャッシュに使う
+_loaded = False
+
+
+def _cell(lat, lon):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+
+def build(rows, hours=None):
+    """
+    lat / lon を持つ拠点の dict リストからインデックスを作る (座標のないものは除く)。
+    hours は rows と同じ順番の (利用可能曜日, 開始時間, 終了時間, 利用可能時間特記事項) のリスト。
+    """
+    global _rows, _lat, _lon, _cells, _cell_range, _version, _loaded
+
+    if hours is None:
+        hours = [(None, None, None, None)] * len(rows)
+    kept = [i for i, row in enumerate(rows) if row.get('lat') is not None and row.get('lon') is not None]
+    rows = [rows[i] for i in kept]
+    hours = [hours[i] for i in kept]
+    lat = np.radians(np.array([row['lat'] for row in rows], dtype=np.float64))
+    lon = np.radians(np.array([row['lon'] for row in rows], dtype=np.float64))
+
+    cells = {}
+    for i, row in enumerate(rows):
+        cells.setdefault(_cell(row['lat'], row['lon']), []).append(i)
+    cells = {key: np.array(indexes, dtype=np.int64) for key, indexes in cells.items()}
+
+    if cells:
+        keys = list(cells)
+        cell_range = (min(k[0] for k in keys), max(k[0] for k in keys),
+                      min(k[1] for k in keys), max(k[1] for k in keys))
+    else:
+        cell_range = (0, 0, 0, 0)
+
+    version = hashlib.sha256(
+        json.dumps([rows, hours], ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()[:16]
+
+    bin_hours.build([bin_hours.parse(*h) for h in hours])
+    bin_categories.build([row.get('type') for row in rows])
+    _rows, _lat, _lon, _cells, _cell_range, _version, _loaded = (
+        rows, lat, lon, cells, cell_range, version, True
+    )
+
+
+def load_from_db():
+    """TrashBin を1回だけ読み込んでインデックスを作り直す"""
+    bins = TrashBin.query.order_by(TrashBin.id).all()
+    rows = [{
+        "id": b.id,
+        "name": b.name,
+        "lat": b.latitude,
+        "lon": b.longitude,
+        "type": b.bin_type,
+        "address": b.address,
+    } for b in bins]
+    hours = [(b.open_days, b.open_time, b.close_time, b.hours_note) for b in bins]
+    build(rows, hours)
+    print(f"✔ Bin index: {len(_rows)} bins in {len(_cells)} cells.")
+
+
+def ensure_loaded():
+    """起動時に読めなかった場合 (seed 前など) はここで読み直す"""
+    if not _loaded:
+        load_from_db()
+
+
+def version():
+    """今のデータの版 (内容が変われば変わる)"""
+    ensure_loaded()
+    return _version
+
+
+def all_rows():
+    """全拠点の dict (coordinates() と同じ順番)"""
+    ensure_loaded()
+    return _rows
+
+
+def rows_in(selected):
+    """bool 配列 (行番号ごと) で選んだ拠点の dict"""
+    ensure_loaded()
+    return [_rows[i] for i in np.flatnonzero(selected)]
+
+
+def coordinates():
+    """全拠点の (緯度, 経度) の配列 (度)"""
+    ensure_loaded()
+    return np.degrees(_lat), np.degrees(_lon)
+
+
+def haversine_m(lat, lon, lats, lons):
+    """(lat, lon) から各点 (lats, lons) までの距離 (m)。引数はすべてラジアン"""
+    dlat = lats - lat
+    dlon = lons - lon
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _ring(ci, cj, r):
+    """中心のマスから r 周目にあるマスの行番号を集める"""
+    if r == 0:
+        keys = [(ci, cj)]
+    else:
+        keys = [(ci + di, cj + dj) for di in range(-r, r + 1) for dj in (-r, r)]
+        keys += [(ci + di, cj + dj) for di in (-r, r) for dj in range(-r + 1, r)]
+    return [_cells[key] for key in keys if key in _cells]
+
+
+def _covered_m(lat, r):
+    """r 周目まで集めたとき、確実に全部を見たと言える半径 (m)"""
+    lat_max = min(abs(lat) + (r + 1) * CELL_DEG, 89.0)
+    return r * CELL_DEG * METERS_PER_DEG * math.cos(math.radians(lat_max))
+
+
+def _outside_rings(ci, cj):
+    """拠点のある範囲の外に何マス離れているか (範囲内なら 0)"""
+    lat_min, lat_max, lon_min, lon_max = _cell_range
+    return max(lat_min - ci, ci - lat_max, lon_min - cj, cj - lon_max, 0)
+
+
+def _max_ring(ci, cj):
+    lat_min, lat_max, lon_min, lon_max = _cell_range
+    return max(abs(ci - lat_min), abs(ci - lat_max), abs(cj - lon_min), abs(cj - lon_max))
+
+
+def nearby(lat, lon, k=20, radius_m=None, selected=None):
+    """
+    (lat, lon) から近い順に最大 k 件の拠点を返す (各 dict に distance_m を付ける)。
+    radius_m を指定すると、その距離より遠い拠点は返さない。
+    selected (行番号ごとの bool 配列) を指定すると、True の拠点だけから探す。
+    """
+    if not _rows or k <= 0:
+        return []
+
+    ci, cj = _cell(lat, lon)
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    last_ring = _max_ring(ci, cj)
+
+    # 拠点のある範囲から遠く離れた地点では、マスを1周ずつ広げるより全件を計算する方が速い
+    if _outside_rings(ci, cj) > FAR_RINGS:
+        last_ring = -1
+
+    chunks = [] if last_ring >= 0 else [np.arange(len(_rows))]
+    if selected is not None and chunks:
+        chunks = [np.flatnonzero(selected)]
+    count = 0
+    r = 0
+    while last_ring >= 0:
+        for indexes in _ring(ci, cj, r):
+            if selected is not None:
+                indexes = indexes[selected[indexes]]
+            chunks.append(indexes)
+            count += len(indexes)
+
+        covered = _covered_m(lat, r)
+        done = r >= last_ring or (radius_m is not None and covered >= radius_m)
+        if not done and count >= k:
+            # 集めた中の k 番目が、見終わった範囲の内側にあればそれより近い拠点はない
+            candidates = np.concatenate(chunks)
+            dist = haversine_m(lat_r, lon_r, _lat[candidates], _lon[candidates])
+            done = np.partition(dist, k - 1)[k - 1] <= covered
+        if done:
+            break
+        r += 1
+
+    if not chunks:
+        return []
+    candidates = np.concatenate(chunks)
+    dist = haversine_m(lat_r, lon_r, _lat[candidates], _lon[candidates])
+    if radius_m is not None:
+        within = dist <= radius_m
+        candidates, dist = candidates[within], dist[within]
+
+    order = np.argsort(dist, kind='stable')[:k]
+    return [{**_rows[candidates[i]], "distance_m": round(float(dist[i]), 1)} for i in order]
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import bin_clusters
+import bin_index
+import response_cache
+
+# ---------------------------------------------------------
+# ゴミ箱の地図タイル (/tiles/bins/{z}/{x}/{y})
+# タイルごとの点 (クラスタ または 拠点) を JSON にし、gzip / brotli 済みの形で
+# メモリ (LRU) とディスクに置く。同じタイルは何人に配っても1回しか作らない。
+# キーにデータの版 (bin_index.version) を含めるので、seed でデータが変われば作り直す。
+#
+#   BIN_TILE_CACHE_SIZE  メモリに置くタイル数 (LRU, 既定 4096)
+#   BIN_TILE_CACHE_DIR   ディスクのキャッシュ置き場 (既定 一時ディレクトリ/banana_tiles)。
+#                        空文字ならディスクには置かない
+#   BIN_TILE_MAX_AGE     ブラウザや CDN にキャッシュさせる秒数 (既定 300秒)
+#   BIN_TILE_KEEP_SECONDS  ほかの版のディスクのタイルを残す秒数 (既定 1日)。
+#                        最後に書き込まれてからこれより経った版だけ消す
+#                        (版はハッシュで新旧が分からず、別のワーカーがまだ使っているかもしれないため)
+# ---------------------------------------------------------
+CACHE_SIZE = int(os.environ.get('BIN_TILE_CACHE_SIZE', 4096))
+CACHE_DIR = os.environ.get('BIN_TILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'banana_tiles'))
+MAX_AGE = int(os.environ.get('BIN_TILE_MAX_AGE', 300))
+KEEP_SECONDS = float(os.environ.get('BIN_TILE_KEEP_SECONDS', 86400))
+MAX_TILE_ZOOM = 22
+
+# ディスクに置く本文の種類と拡張子
+_FILES = {"identity": "json", "gzip": "json.gz", "br": "json.br"}
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # (版, z, x, y) -> response_cache のエントリ
+_building = {}             # (版, z, x, y) -> 作成中を待つための Event
+_disk_version = None       # ディスクの古い版を消し終えた版
+
+
+def is_valid(z, x, y):
+    return 0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _tile_dir(version, z, x):
+    return os.path.join(CACHE_DIR, version, str(z), str(x))
+
+
+def _read_disk(version, z, x, y):
+    if not CACHE_DIR:
+        return None
+    base = os.path.join(_tile_dir(version, z, x), str(y))
+    entry = {}
+    try:
+        for encoding, ext in _FILES.items():
+            path = f"{base}.{ext}"
+            if encoding == 'br' and not os.path.exists(path):
+                entry[encoding] = None   # brotli なしで作ったタイル
+                continue
+            with open(path, 'rb') as f:
+                entry[encoding] = f.read()
+    except OSError:
+        return None
+    entry["etag"] = hashlib.sha256(entry["identity"]).hexdigest()[:32]
+    return entry
+
+
+def _prune_disk(version):
+    """version 以外で、KEEP_SECONDS より長く書き込まれていない版のディレクトリを消す"""
+    expire = time.time() - KEEP_SECONDS
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            if name != version and os.path.getmtime(path) < expire:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue   # ほかのワーカーが先に消した
+
+
+def _write_disk(version, z, x, y, entry):
+    global _disk_version
+    if not CACHE_DIR:
+        return
+    try:
+        # 版が変わったら、しばらく書き込まれていないほかの版のタイルをまとめて消す
+        if _disk_version != version and os.path.isdir(CACHE_DIR):
+            _prune_disk(version)
+        _disk_version = version
+
+        directory = _tile_dir(version, z, x)
+        os.makedirs(directory, exist_ok=True)
+        # 版のディレクトリの更新時刻を「最後に使った時刻」にする (_prune_disk が見る)
+        os.utime(os.path.join(CACHE_DIR, version))
+        # 本文 (identity) を最後に置き、それがあれば全部揃っているとみなす
+        for encoding in ('br', 'gzip', 'identity'):
+            if entry[encoding] is None:
+                continue
+            path = os.path.join(directory, f"{y}.{_FILES[encoding]}")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(entry[encoding])
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARNING: tile cache not writable: {e}")
+
+
+def _remember(key, entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def get_tile(z, x, y):
+    """タイルのエントリ (response_cache.make_response に渡せる形) を返す"""
+    version = bin_index.version()
+    key = (version, z, x, y)
+
+    while True:
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                _entries.move_to_end(key)
+                return entry
+            waiter = _building.get(key)
+            if waiter is None:
+                # 自分が作る。同じタイルを同時に頼んだ他のリクエストは、できるまで待つ
+                waiter = _building[key] = threading.Event()
+                break
+        waiter.wait()
+
+    try:
+        entry = _read_disk(version, z, x, y)
+        if entry is None:
+            entry = response_cache.build_entry({
+                "version": version,
+                "z": z, "x": x, "y": y,
+                "features": bin_clusters.query_tile(z, x, y),
+            })
+            _write_disk(version, z, x, y, entry)
+        _remember(key, entry)
+        return entry
+    finally:
+        with _lock:
+            del _building[key]
+        waiter.set()
+
+
+def metrics():
+    with _lock:
+        return {"cached_tiles": len(_entries), "building": len(_building)}
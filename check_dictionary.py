@@ -0,0 +1,136 @@
+import datetime
+import os
+import sys
+
+import data_loader
+import predictor
+import schedule_store
+from models import TrashType
+
+# ---------------------------------------------------------
+# 分別辞書の判定チェック (AIは呼ばない)
+# 辞書の全品目を /api/classify_text と同じ流れ (predictor.classify_text) で判定し、
+# 照合された辞書の行について
+#   - ゴミ種類がある分別 -> DB の trash_types の id になるか
+#   - ゴミ種類がない分別 (スプレー缶・カセットボンベ、ライター、筒型乾電池、
+#     市で収集しないもの など) -> type_id が None で、辞書の分別名を返すか
+# を確認する。期待する id は下の対応表と trash_types の行から作り、
+# predictor の変換は使わない。燃やせるごみ などに推測した type_id を返していたら失敗にする。
+# あわせて、ゴミ種類のある分別はすべて、エリア1で年の途中の日付から次の収集日が出るかも確認する。
+#
+#   python check_dictionary.py   -> 全件OKなら終了コード 0
+#   DATABASE_URL                 trash_types を読むDB (アプリと同じ)
+# ---------------------------------------------------------
+
+# 辞書の分別名 -> trash_types.name_ja (None はゴミ種類のない分別)
+CATEGORY_TYPES = {
+    "燃やせるごみ": "燃やせるごみ",
+    "燃やせないごみ": "燃やせないごみ",
+    "びん・缶・ペットボトル": "びん・缶・ペット",
+    "容器包装プラスチック": "容器包装プラスチック",
+    "雑がみ": "雑がみ",
+    "枝・葉・草": "枝・葉・草",
+    "大型ごみ": "大型ごみ",
+    "スプレー缶・カセットボンベ": None,
+    "加熱式たばこ・電子たばこ、ライター": None,
+    "筒型乾電池": None,
+    "市で収集しないもの": None,
+    "集団資源回収など": None,
+    "（備考欄参照）": None,
+}
+
+# 収集日のない分別 (申込制)
+NO_SCHEDULE = {"大型ごみ"}
+
+# 収集日を確かめるエリアと日付
+SCHEDULE_AREA_ID = 1
+SCHEDULE_DAY = datetime.date(2025, 6, 15)
+
+# ゴミ種類のない分別の品名 (部分的な名前でも辞書で決まること)
+UNMAPPED_QUERIES = ["スプレー缶", "カセットボンベ", "ライター", "乾電池", "テレビ"]
+
+
+def expected_type_ids():
+    """分別名 -> 期待する trash_types.id (DB の行から引く)"""
+    ids = {row.name_ja: row.id for row in TrashType.query.all()}
+    missing = [name for name in CATEGORY_TYPES.values() if name and name not in ids]
+    if missing:
+        raise RuntimeError(f"trash_types に {missing} がありません (seed.py を実行してください)")
+    return {category: ids.get(name) if name else None for category, name in CATEGORY_TYPES.items()}
+
+
+def check_row(query, row, expected_ids):
+    """1件を判定して、問題があれば説明の文字列を返す (問題なければ None)"""
+    category = row.get('trash_type_str')
+    if category not in expected_ids:
+        return f"対応表にない分別です ({category})"
+    try:
+        result = predictor.classify_text(query, None, 'ja')
+    except predictor.PredictionError as e:
+        return f"辞書で決まらずAIに問い合わせました ({e})"
+    if result["model_used"] != "dictionary":
+        return f"辞書で決まりませんでした (model_used={result['model_used']})"
+
+    expected = expected_ids[category]
+    if result["type_id"] != expected:
+        return f"type_id={result['type_id']} (期待値 {expected}, 分別 {category})"
+    if expected is None and result["type"] != category:
+        return f"type={result['type']} (期待値 {category})"
+    return None
+
+
+def check_schedules(expected_ids):
+    """ゴミ種類のある分別ごとに、次の収集日が出るか確認して失敗の件数を返す"""
+    schedule_store.load_from_db()
+    failures = 0
+    for category, expected in expected_ids.items():
+        if expected is None or category in NO_SCHEDULE:
+            continue
+        type_id = schedule_store.type_id_for_category(category)
+        next_date = schedule_store.get_next_date(SCHEDULE_AREA_ID, type_id, SCHEDULE_DAY)
+        if type_id != expected or next_date is None:
+            failures += 1
+            print(f"✖ {category}: 収集日がありません (type_id={type_id}, 期待値 {expected})")
+    return failures
+
+
+def main():
+    # アプリのDB設定 (DATABASE_URL) で trash_types を読む
+    from app import app
+
+    with app.app_context():
+        expected_ids = expected_type_ids()
+        data_loader.load_data()
+        rows = data_loader.get_dictionary_list()
+
+        queries = [row['name_ja'] for row in rows if row.get('name_ja')] + UNMAPPED_QUERIES
+
+        failures = check_schedules(expected_ids)
+        unmapped = 0
+        for query in queries:
+            # 同じ名前の品目 (素材違いなど) があるので、期待値は実際に照合された行から作る
+            match = data_loader.match_dictionary(query, min_score=predictor.TEXT_MIN_MATCH)
+            if not match:
+                problem = "辞書に見つかりませんでした"
+            else:
+                is_unmapped = expected_ids.get(match["row"].get('trash_type_str')) is None
+                unmapped += is_unmapped
+                problem = check_row(query, match["row"], expected_ids)
+                if query in UNMAPPED_QUERIES and not problem and not is_unmapped:
+                    problem = "ゴミ種類のない分別に照合されませんでした"
+            if problem:
+                failures += 1
+                print(f"✖ {query}: {problem}")
+
+    print(f"{len(queries)} 件を確認しました (ゴミ種類のない分別 {unmapped} 件)。")
+    if failures:
+        print(f"✖ {failures} 件が想定と違う判定でした。")
+        return False
+    print("✔ 全件、辞書の分別どおりに判定しました。")
+    return True
+
+
+if __name__ == '__main__':
+    # 辞書で決まらない品目を見つけるためのチェックなので、AIキーは仮の値でよい
+    os.environ.setdefault('GEMINI_API_KEY', 'check')
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+import pytest
+
+# ---------------------------------------------------------
+# pytest の共通設定
+# app を import する前に、DB・AIの状態ファイルを一時ディレクトリに向ける
+# (本番の DATABASE_URL を使わない。AIのキーは仮の値)。
+# test_api.py は起動中のサーバーに画像を送る手動の確認スクリプト、backend/ は古い版の写しなので集めない。
+# ---------------------------------------------------------
+_TMP_DIR = tempfile.mkdtemp(prefix='banana_test_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_TMP_DIR, 'banana.db')}"
+os.environ['AI_RATE_DB_PATH'] = os.path.join(_TMP_DIR, 'rate_limits.db')
+os.environ['BIN_TILE_CACHE_DIR'] = os.path.join(_TMP_DIR, 'tiles')
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+collect_ignore = ['test_api.py', 'backend']
+
+
+@pytest.fixture(scope='session')
+def seeded_app():
+    """seed.py でデータを入れた一時DBのアプリ (アプリのコンテキスト内で使う)"""
+    import seed
+    from app import app
+
+    seed.seed_data()
+    with app.app_context():
+        yield app
@@ -1,12 +1,28 @@
 import csv
+import math
 import os
 import random
+import re
+
+from fuzzy_match import QGramIndex, similarity
+from text_normalizer import normalize, to_hiragana
 
 # ---------------------------------------------------------
 # データを保持する変数 (モジュール変数としてキャッシュ)
 # ---------------------------------------------------------
 _trash_dictionary = []
-_trash_type_map = {}
+_exact_index = {}      # 正規化した名前 -> [行番号, ...] (完全一致用)
+_fuzzy_index = QGramIndex()   # 編集距離検索用
+_partial_index = QGramIndex()   # 正規化した日本語名・英語名 -> [行番号, ...] (部分一致用)
+
+# 辞書の名前列 (この全言語の名前でAIの回答と照合する)
+NAME_COLUMNS = ['name_ja', 'name_en', 'name_zh_cn', 'name_ko', 'name_vi', 'name_ru', 'name_id']
+
+# 辞書の行とみなす類似度の下限 (これより似ていない名前は照合しない)
+MIN_MATCH = 0.8
+
+# 「〜（紙製）」のような括弧書きは照合のときに外した形も登録する
+_PAREN = re.compile(r"[（(][^）)]*[）)]")
 
 # データセットフォルダのパス (このファイルから見た相対パス)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -17,7 +33,7 @@ def load_data():
     すべてのCSVデータを読み込んでメモリに準備する関数。
     app.py の起動時に一度だけ呼ばれます。
     """
-    global _trash_dictionary, _trash_type_map
+    global _trash_dictionary, _exact_index, _fuzzy_index, _partial_index
     
     print("--- Loading Datasets ---")
 
@@ -32,52 +48,109 @@ def load_data():
         print(f"✖ Error loading dictionary: {e}")
         _trash_dictionary = []
 
-    # 2. ゴミ種類IDのマッピング (trash_types.csvを元にする場合もここで処理可能)
-    # ここでは固定マップとして定義していますが、csvから読む形にも拡張できます
-    _trash_type_map = {
-        "燃やせるごみ": 1,
-        "燃やせないごみ": 2,
-        "びん・缶・ペットボトル": 3,
-        "容器包装プラスチック": 4,
-        "雑がみ": 5,
-        "枝・葉・草": 6,
-        "大型ごみ": 99, 
-        "収集なし": 0
-    }
-
-def get_trash_type_map():
-    """ゴミ種類マップを返す"""
-    if not _trash_type_map: load_data()
-    return _trash_type_map
+    # 1.5 照合用インデックス (完全一致のハッシュと編集距離の q-gram インデックス)
+    _exact_index, _fuzzy_index, _partial_index = _build_match_index(_trash_dictionary)
+    print(f"✔ Indexed {len(_exact_index)} dictionary names for matching.")
 
 def get_dictionary_list():
     """辞書リストそのものを返す"""
     if not _trash_dictionary: load_data()
     return _trash_dictionary
 
-def find_in_dictionary(search_term):
+def _match_keys(name):
+    """照合用のキー: 正規化した名前・ひらがな・括弧書きを外した形"""
+    text = normalize(name)
+    if not text:
+        return set()
+    keys = {text, to_hiragana(text)}
+    stripped = normalize(_PAREN.sub("", text))
+    if stripped:
+        keys.update({stripped, to_hiragana(stripped)})
+    return keys
+
+
+def _build_match_index(rows):
+    exact = {}
+    fuzzy = QGramIndex()
+    partial = QGramIndex()
+    for i, row in enumerate(rows):
+        for col in NAME_COLUMNS:
+            for key in _match_keys(row.get(col, '')):
+                exact.setdefault(key, []).append(i)
+                fuzzy.add(key, i)
+        for col in ('name_ja', 'name_en'):
+            name = normalize(row.get(col, ''))
+            partial.add(name, i)
+    return exact, fuzzy, partial
+
+
+def _max_distance(term):
+    """許容する編集距離 (短い語ほど厳しくする。長い語でも 2 まで)"""
+    if len(term) <= 3:
+        return 0
+    if len(term) <= 6:
+        return 1
+    return 2
+
+
+def match_dictionary(search_term, min_score=MIN_MATCH):
     """
-    辞書から用語を検索するロジック
-    (app.py にあったものをここに移動)
+    AIが返した名前 (どの言語でもよい) を辞書と照合する。
+    1. 正規化した名前の完全一致 (ハッシュ)
+    2. 編集距離による近似一致 (q-gram インデックス)
+    3. 部分一致 (日本語名・英語名。短い方が長い方の min_score 以上の長さのときだけ)
+    類似度が min_score 以上のものだけを、見つかれば {"row": 辞書の行, "score": 類似度 0〜1, "method": 照合方法} を返す。
     """
     if not _trash_dictionary: load_data()
     if not search_term: return None
-    
-    term = search_term.lower().strip()
+
+    terms = _match_keys(search_term)
+    if not terms:
+        return None
 
     # 1. 完全一致
-    for row in _trash_dictionary:
-        if row.get('name_ja', '').strip() == term or \
-           row.get('name_en', '').lower().strip() == term:
-            return row
-
-    # 2. 部分一致
-    for row in _trash_dictionary:
-        if term in row.get('name_ja', '') or \
-           term in row.get('name_en', '').lower():
-            return row
-            
-    return None
+    for term in terms:
+        hits = _exact_index.get(term)
+        if hits:
+            return {"row": _trash_dictionary[hits[0]], "score": 1.0, "method": "exact"}
+
+    # 2. 編集距離
+    best = None
+    for term in terms:
+        max_distance = _max_distance(term)
+        if max_distance == 0:
+            continue   # 距離 0 は完全一致で調べ済み
+        for distance, word, hits in _fuzzy_index.search(term, max_distance):
+            score = similarity(term, word, distance)
+            if score >= min_score and (best is None or score > best["score"]):
+                best = {"row": _trash_dictionary[hits[0]], "score": score, "method": "fuzzy"}
+    if best:
+        return best
+
+    # 3. 部分一致 (AIの名前が辞書名の一部、またはその逆)
+    #    類似度は 短い方の長さ / 長い方の長さ なので、調べる長さを min_score で絞れる
+    term = normalize(search_term)
+    if not term or min_score <= 0:
+        return None
+    candidates = _partial_index.containing(term, int(len(term) / min_score + 1e-9))
+    candidates += _partial_index.contained(term, math.ceil(len(term) * min_score - 1e-9))
+    best_key = None
+    for name, hits in candidates:
+        score = min(len(term), len(name)) / max(len(term), len(name))
+        # 同じ類似度なら辞書の前の行を使う
+        if score >= min_score and (best_key is None or (score, -hits[0]) > best_key):
+            best_key = (score, -hits[0])
+            best = {"row": _trash_dictionary[hits[0]], "score": score, "method": "partial"}
+    return best
+
+
+def find_in_dictionary(search_term):
+    """
+    辞書から用語を検索するロジック
+    (見つかった行だけを返す。類似度も欲しい場合は match_dictionary を使う)
+    """
+    match = match_dictionary(search_term)
+    return match["row"] if match else None
 
 def get_random_item():
     """デモ用にランダムなゴミデータを1つ返す"""
@@ -0,0 +1,144 @@
+# ---------------------------------------------------------
+# 編集距離によるあいまい検索 (q-gram の転置インデックス)
+# AIが返した名前の表記ゆれ (送り仮名・長音・スペルミス等) を辞書に寄せるために使う。
+# ---------------------------------------------------------
+
+
+def levenshtein(a, b):
+    """
+    2つの文字列の編集距離 (挿入・削除・置換のコストはすべて1)。
+    Myers/Hyyrö のビット並列法で、短い方の文字列を整数のビット列として扱う。
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+
+    # b の各文字が現れる位置のビットマスク
+    peq = {}
+    for i, c in enumerate(b):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    m = len(b)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+
+    for c in a:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+def similarity(a, b, distance=None):
+    """編集距離を 0.0〜1.0 の類似度に変換する (1.0 が完全一致)"""
+    if distance is None:
+        distance = levenshtein(a, b)
+    longest = max(len(a), len(b))
+    return 1.0 - distance / longest if longest else 1.0
+
+
+class QGramIndex:
+    """
+    2文字ずつの断片 (q-gram) の転置インデックスで、編集距離 max_distance 以内の語を探す。
+    距離 d 以内の2語は「断片を (断片数 - 2d) 個以上共有する」ので、
+    出現数の少ない断片から必要な数だけ調べて候補を集め、長さと共有する断片の数で
+    ふるい落としてから、残った候補だけ編集距離を計算する。
+    (辞書にない語を探すときも、ほとんどの語と距離を計算せずに済む)
+    """
+    Q = 2
+
+    def __init__(self):
+        self._values = {}     # 語 -> 値リスト
+        self._words = []      # 語の番号 -> 語
+        self._gram_sets = []  # 語の番号 -> その語の断片の集合
+        self._postings = {}   # 断片 -> その断片を含む語の番号のリスト
+        self.size = 0
+
+    def _grams(self, word):
+        return [word[i:i + self.Q] for i in range(len(word) - self.Q + 1)]
+
+    def add(self, word, value):
+        if not word:
+            return
+        if word in self._values:
+            self._values[word].append(value)
+            return
+        self._values[word] = [value]
+        word_id = len(self._words)
+        self._words.append(word)
+        grams = frozenset(self._grams(word))
+        self._gram_sets.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(word_id)
+        self.size += 1
+
+    def search(self, word, max_distance):
+        """距離 max_distance 以内の (距離, 語, 値リスト) を距離の近い順に返す"""
+        if not self._words or not word:
+            return []
+
+        grams = self._grams(word)
+        distinct = frozenset(grams)
+        # 共有が保証される「異なる断片」の数 (同じ断片が何度も出る分は差し引く)
+        need = len(grams) - self.Q * max_distance - (len(grams) - len(distinct))
+        if need > 0:
+            rare = sorted(distinct, key=lambda gram: len(self._postings.get(gram, ())))
+            candidates = set()
+            for gram in rare[:len(distinct) - need + 1]:
+                candidates.update(self._postings.get(gram, ()))
+        else:
+            candidates = range(len(self._words))   # 短すぎて絞れないときは全件
+
+        found = []
+        for word_id in candidates:
+            candidate = self._words[word_id]
+            if abs(len(candidate) - len(word)) > max_distance:
+                continue
+            if need > 0 and len(distinct & self._gram_sets[word_id]) < need:
+                continue
+            d = levenshtein(word, candidate)
+            if d <= max_distance:
+                found.append((d, candidate, self._values[candidate]))
+
+        found.sort(key=lambda x: (x[0], x[1]))
+        return found
+
+    def containing(self, word, max_length):
+        """word を含む max_length 文字以下の (語, 値リスト) を返す (word の断片をすべて持つ語だけ調べる)"""
+        if len(word) < self.Q:
+            values = self._values.get(word)
+            return [(word, values)] if values and len(word) <= max_length else []
+        distinct = frozenset(self._grams(word))
+        rare = min(distinct, key=lambda gram: len(self._postings.get(gram, ())))
+        found = []
+        for word_id in self._postings.get(rare, ()):
+            candidate = self._words[word_id]
+            if len(candidate) > max_length or not distinct <= self._gram_sets[word_id]:
+                continue
+            if word in candidate:
+                found.append((candidate, self._values[candidate]))
+        return found
+
+    def contained(self, word, min_length):
+        """word の一部分で、min_length 文字以上の登録済みの (語, 値リスト) を返す"""
+        found = {}
+        for length in range(max(min_length, 1), len(word) + 1):
+            for start in range(len(word) - length + 1):
+                part = word[start:start + length]
+                if part in self._values:
+                    found[part] = self._values[part]
+        return list(found.items())
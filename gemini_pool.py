@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+
+import ai_backend
+
+# ---------------------------------------------------------
+# Gemini クライアントの共有とモデルごとのサーキットブレーカー
+# クライアントはプロセスで1つだけ作り、HTTP接続 (TLS) を使い回す。
+# 503 / UNAVAILABLE / クォータ超過が続いたモデルは、しばらく呼ばずに飛ばす。
+#
+#   AI_BREAKER_THRESHOLD  何回続けて失敗したら止めるか (既定 3)
+#   AI_BREAKER_COOLDOWN   止めておく秒数 (既定 30秒)
+# ---------------------------------------------------------
+BREAKER_THRESHOLD = int(os.environ.get('AI_BREAKER_THRESHOLD', 3))
+BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN', 30))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """プロセス共通のクライアントを返す (最初の呼び出しで作る。呼び出し先は AI_BACKEND で切り替え)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ai_backend.make_client()
+    return _client
+
+
+class CircuitOpenError(Exception):
+    """ブレーカーが開いているモデルを呼ぼうとした"""
+
+
+def is_breaker_error(error):
+    """サーキットブレーカーの失敗として数えるエラー (一時停止・クォータ超過)"""
+    msg = str(error)
+    return any(code in msg for code in ("503", "UNAVAILABLE", "429", "RESOURCE_EXHAUSTED"))
+
+
+class CircuitBreaker:
+    """
+    closed: 通常どおり呼ぶ
+    open: 失敗が続いたので cooldown の間は呼ばない
+    half_open: cooldown が明けたので1件だけ試しに通す (成功すれば closed に戻る)
+    """
+
+    def __init__(self, name, threshold=None, cooldown=None):
+        self.name = name
+        self.threshold = threshold or BREAKER_THRESHOLD
+        self.cooldown = cooldown or BREAKER_COOLDOWN
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def try_acquire(self):
+        """このモデルを今呼んでよいか (half_open のときは1件だけ通す)"""
+        with self._lock:
+            state = self.state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self):
+        """open のとき、あと何秒で試せるようになるか"""
+        if self.opened_at is None:
+            return 0
+        return max(self.cooldown - (time.monotonic() - self.opened_at), 0)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.last_error = str(error)[:200]
+            self.trial_in_flight = False
+            if not is_breaker_error(error):
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                # half_open の試行が失敗した場合も、もう一度 cooldown に入る
+                self.opened_at = time.monotonic()
+
+    def to_dict(self):
+        return {
+            "model": self.name,
+            "state": self.state(),
+            "consecutive_failures": self.failures,
+            "retry_after": round(self.retry_after(), 1),
+            "last_error": self.last_error,
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model_name):
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(model_name)
+        return _breakers[model_name]
+
+
+def available_models(models):
+    """サーキットブレーカーが止めていないモデルだけを順番どおりに返す"""
+    return [m for m in models if get_breaker(m).state() != 'open']
+
+
+def retry_after(models):
+    """全モデルが止まっているとき、最初に試せるようになるまでの秒数"""
+    return min((get_breaker(m).retry_after() for m in models), default=0)
+
+
+def generate_content(model_name, **kwargs):
+    """共有クライアントで generate_content を呼び、結果をブレーカーに記録する"""
+    breaker = get_breaker(model_name)
+    if not breaker.try_acquire():
+        raise CircuitOpenError(f"{model_name} is cooling down")
+    try:
+        response = get_client().models.generate_content(model=model_name, **kwargs)
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    breaker.record_success()
+    return response
+
+
+def generate_content_stream(model_name, **kwargs):
+    """
+    共有クライアントで generate_content_stream を呼び、届いた断片を順に返すジェネレーター。
+    最初の断片が届いた時点で成功、途中で例外になれば失敗としてブレーカーに記録する。
+    """
+    breaker = get_breaker(model_name)
+    if not breaker.try_acquire():
+        raise CircuitOpenError(f"{model_name} is cooling down")
+    recorded = False
+    try:
+        for chunk in get_client().models.generate_content_stream(model=model_name, **kwargs):
+            if not recorded:
+                breaker.record_success()
+                recorded = True
+            yield chunk
+    except Exception as e:
+        breaker.record_failure(e)
+        recorded = True
+        raise
+    finally:
+        # 何も届かないまま読むのをやめた場合も、half_open の試行枠は返しておく
+        if not recorded:
+            breaker.record_failure(RuntimeError("stream closed before any response"))
+
+
+def status():
+    """全モデルのブレーカーの状態"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [b.to_dict() for b in breakers]
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import threading
+import time
+
+# ---------------------------------------------------------
+# 同じ判定要求の重複実行を防ぐ (Idempotency-Key)
+# 通信が切れてアプリが同じ画像を送り直しても、AIを2回呼ばないようにする。
+# - 実行中の同じ要求は、1回の実行の結果を待って受け取る (single-flight)
+# - 終わった要求は TTL の間、同じ結果をそのまま返す (リプレイ)。後から失敗と分かったものは返し直さない
+# キーは Idempotency-Key ヘッダー、なければ送られた内容の SHA-256。
+# ※プロセス内に保持するので、複数ワーカーの場合は同じワーカーに届いたときだけ効く
+#
+#   IDEMPOTENCY_TTL           結果を返し直す秒数 (既定 300秒)
+#   IDEMPOTENCY_MAX_ENTRIES   覚えておく件数 (既定 1024)
+#   IDEMPOTENCY_WAIT_TIMEOUT  実行中の同じ要求を待つ最大秒数 (既定 60秒)
+# ---------------------------------------------------------
+TTL_SECONDS = float(os.environ.get('IDEMPOTENCY_TTL', 300))
+MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 1024))
+WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 60))
+
+_flights = {}          # キー -> _Flight (実行中 / 終わって TTL 内)
+_lock = threading.Lock()
+
+
+class KeyReused(Exception):
+    """同じ Idempotency-Key で、中身の違う要求が送られた"""
+
+
+class _Flight:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+
+def fingerprint(*parts):
+    """要求の中身 (バイト列・文字列) の SHA-256"""
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b''
+        h.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def request_key(scope, header_key, content_hash):
+    """ヘッダーのキーがあればそれを、なければ中身のハッシュをキーにする"""
+    if header_key:
+        return (scope, 'key', header_key)
+    return (scope, 'sha256', content_hash)
+
+
+def _purge_expired():
+    now = time.time()
+    expired = [key for key, flight in _flights.items()
+               if flight.finished_at and now - flight.finished_at > TTL_SECONDS]
+    for key in expired:
+        del _flights[key]
+
+    # 多すぎる場合は、終わったものを古い順に捨てる
+    if len(_flights) > MAX_ENTRIES:
+        finished = sorted((f.finished_at, key) for key, f in _flights.items() if f.finished_at)
+        for _, key in finished[:len(_flights) - MAX_ENTRIES]:
+            del _flights[key]
+
+
+def run(key, content_hash, func, is_failed=None):
+    """
+    key の要求を1回だけ実行し、(結果, リプレイかどうか) を返す。
+    実行中なら終わるのを待ち、TTL 内に終わっていればその結果を返す。
+    func が例外を投げた場合は覚えず、待っていた要求にも同じ例外を投げる。
+    is_failed(結果) を渡すと、覚えている結果が後から失敗になったもの
+    (非同期ジョブがエラーで終わった など) は返し直さず、捨てて実行し直す。
+    """
+    with _lock:
+        _purge_expired()
+        flight = _flights.get(key)
+        if (flight is not None and flight.finished_at and is_failed is not None
+                and flight.fingerprint == content_hash and is_failed(flight.result)):
+            del _flights[key]
+            flight = None
+        owner = flight is None
+        if owner:
+            flight = _flights[key] = _Flight(content_hash)
+        elif flight.fingerprint != content_hash:
+            raise KeyReused("Idempotency-Key was already used with a different request")
+
+    if not owner:
+        if flight.done.wait(WAIT_TIMEOUT):
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        # 先の要求が終わらない場合は待つのをやめて自分で実行する
+        return func(), False
+
+    try:
+        result = func()
+    except Exception as e:
+        flight.error = e
+        with _lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+        flight.done.set()
+        raise
+
+    flight.result = result
+    flight.finished_at = time.time()
+    flight.done.set()
+    return result, False
+
+
+def metrics():
+    with _lock:
+        in_flight = sum(1 for f in _flights.values() if not f.finished_at)
+        return {"in_flight": in_flight, "stored": len(_flights) - in_flight}
@@ -0,0 +1,66 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# ---------------------------------------------------------
+# AIに送る前の画像の前処理
+# スマホの写真は数百万画素あるが、缶かびんかを見分けるのにそこまでは要らない。
+# 縮小してから JPEG で再圧縮し、送信量と AI 側の処理時間を減らす。
+#
+#   IMAGE_MAX_EDGE      長辺の最大ピクセル数 (既定 1024)
+#   IMAGE_JPEG_QUALITY  再圧縮の JPEG 品質 (既定 80)
+#   IMAGE_WORKERS       前処理を行うスレッド数 (既定 2)
+# ---------------------------------------------------------
+MAX_EDGE = int(os.environ.get('IMAGE_MAX_EDGE', 1024))
+JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 80))
+WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+# リクエストを処理するスレッドでデコードしないよう、専用のスレッドプールで行う
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='image-preprocess')
+
+
+class PreparedImage:
+    """前処理済みの画像 (ハッシュ計算用の PIL 画像と、送信用の JPEG バイト列)"""
+
+    def __init__(self, image, data, mime_type='image/jpeg'):
+        self.image = image
+        self.data = data
+        self.mime_type = mime_type
+
+
+def preprocess(raw, max_edge=None, quality=None):
+    """
+    アップロードされたバイト列を、向きを直して縮小した JPEG にする。
+    読めない画像なら PIL の例外がそのまま上がる。
+    """
+    max_edge = max_edge or MAX_EDGE
+    quality = quality or JPEG_QUALITY
+
+    img = Image.open(io.BytesIO(raw))
+    is_jpeg = img.format == 'JPEG'
+    orientation = img.getexif().get(0x0112, 1)
+    small_enough = max(img.size) <= max_edge
+    if is_jpeg:
+        # JPEG はデコード時に 1/2, 1/4, 1/8 に縮小できるので、全画素を展開しない
+        img.draft('RGB', (max_edge, max_edge))
+
+    # EXIF の回転情報を反映 (縦向きで撮った写真が横倒しで送られないように)
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    # 元から小さく向きも正しい JPEG は、再圧縮せずそのまま送る (画質を落とさない)
+    if is_jpeg and small_enough and orientation == 1:
+        return PreparedImage(img, raw)
+
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=quality, optimize=True)
+    return PreparedImage(img, out.getvalue())
+
+
+def submit(raw, max_edge=None, quality=None):
+    """前処理をスレッドプールに投げて Future を返す"""
+    return _executor.submit(preprocess, raw, max_edge, quality)
@@ -0,0 +1,137 @@
+import sys
+import os
+
+# VS Code等の環境でインポートエラー（解決できない）が出る場合の対策
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import datetime
+from sqlalchemy import inspect, text
+from app import app
+from models import db, Schedule, TrashDictionary
+
+# ---------------------------------------------------------
+# インデックス・カラムのマイグレーション
+# seed.py は drop_all()/create_all() で作り直すが、本番DBは消したくないので
+# models.py に後から足したカラム (NULL 可のもの) と
+# models.py の __table_args__ に書いたインデックスのうち、無いものだけを追加する。
+#
+#   python migrate.py            -> 足りないカラム・インデックスを作成
+#   python migrate.py --explain  -> 各APIのクエリがインデックスを使うか EXPLAIN で確認
+# ---------------------------------------------------------
+
+
+def add_missing_columns():
+    """models.py で宣言されたカラムのうち、DBのテーブルに無いものを ALTER TABLE で追加する"""
+    inspector = inspect(db.engine)
+    added = 0
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    print(f"✖ {table.name}.{column.name} は NOT NULL のため自動では追加できません。")
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"✔ {table.name}.{column.name} を追加しました。")
+                added += 1
+    return added
+
+
+def migrate():
+    """models.py で宣言されたカラム・インデックスのうち、DBに無いものを作成する"""
+    with app.app_context():
+        print(f"カラム {add_missing_columns()} 件を追加しました。")
+
+        checked = 0
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                # checkfirst=True なので既にあれば何もしない (何度実行してもOK)
+                index.create(bind=db.engine, checkfirst=True)
+                print(f"✔ {table.name}.{index.name}")
+                checked += 1
+        print(f"インデックス {checked} 件を確認しました。")
+
+
+def _verification_queries():
+    """(説明, 使ってほしいインデックス名, クエリ) の一覧。各APIのアクセスパターンに合わせる"""
+    today = datetime.date.today()
+    return [
+        (
+            "/api/schedules (area_id + 日付範囲)",
+            'ix_schedules_area_date',
+            Schedule.query.filter(
+                Schedule.area_id == 1,
+                Schedule.date >= today.replace(month=1, day=1),
+                Schedule.date <= today.replace(month=12, day=31),
+            ),
+        ),
+        (
+            "predict_trash 次回収集日 (area_id + trash_type_id)",
+            'ix_schedules_area_type_date',
+            Schedule.query.filter(
+                Schedule.area_id == 1,
+                Schedule.trash_type_id == 1,
+                Schedule.date >= today,
+            ).order_by(Schedule.date.asc()).limit(1),
+        ),
+        (
+            "/api/trash_search (cat_id + name_kana 順)",
+            'ix_trash_dictionaries_type_kana',
+            TrashDictionary.query.filter(
+                TrashDictionary.trash_type_id == 1
+            ).order_by(TrashDictionary.name_kana.asc()).limit(50),
+        ),
+        (
+            "/api/trash_dictionary (name_kana 順)",
+            'ix_trash_dictionaries_kana',
+            TrashDictionary.query.order_by(TrashDictionary.name_kana.asc()),
+        ),
+    ]
+
+
+def explain():
+    """各クエリの実行計画を表示し、想定したインデックスが使われているか確認する"""
+    with app.app_context():
+        dialect = db.engine.dialect
+        if dialect.name == 'postgresql':
+            prefix = "EXPLAIN "
+        elif dialect.name == 'sqlite':
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            print(f"✖ {dialect.name} の EXPLAIN には未対応です。")
+            return False
+
+        all_ok = True
+        with db.engine.connect() as conn:
+            if dialect.name == 'postgresql':
+                # データが少ないと seq scan が選ばれるので、使えるインデックスがあるかだけを見る
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+
+            for label, index_name, query in _verification_queries():
+                sql = str(query.statement.compile(
+                    dialect=dialect, compile_kwargs={"literal_binds": True}
+                ))
+                rows = conn.execute(text(prefix + sql)).fetchall()
+                plan = "\n".join(" | ".join(str(col) for col in row) for row in rows)
+
+                ok = index_name in plan
+                all_ok = all_ok and ok
+                print(f"{'✔' if ok else '✖'} {label} -> {index_name}")
+                for line in plan.splitlines():
+                    print(f"    {line}")
+
+            conn.rollback()
+
+        print("全てのクエリがインデックスを使用しています。" if all_ok else "インデックスを使っていないクエリがあります。")
+        return all_ok
+
+
+if __name__ == '__main__':
+    if '--explain' in sys.argv:
+        sys.exit(0 if explain() else 1)
+    migrate()
@@ -92,6 +92,12 @@ class Schedule(db.Model):
 
     trash_type = db.relationship('TrashType', backref='schedules')
 
+    # カレンダー (area_id + 日付範囲) と 次回収集日 (area_id + trash_type_id + 日付) 用
+    __table_args__ = (
+        db.Index('ix_schedules_area_date', 'area_id', 'date'),
+        db.Index('ix_schedules_area_type_date', 'area_id', 'trash_type_id', 'date'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -127,6 +133,12 @@ class TrashDictionary(db.Model):
 
     trash_type = db.relationship('TrashType', backref='dictionaries')
 
+    # 検索 (trash_type_id で絞って name_kana 順) と 辞書一覧 (name_kana 順) 用
+    __table_args__ = (
+        db.Index('ix_trash_dictionaries_type_kana', 'trash_type_id', 'name_kana'),
+        db.Index('ix_trash_dictionaries_kana', 'name_kana'),
+    )
+
     # ★Flutter用：言語コードを受け取って、その国の言葉で返す魔法のメソッド
     def get_localized_data(self, lang_code):
         # 1. 名前と言語の取得
@@ -162,6 +174,13 @@ class TrashBin(db.Model):
     bin_type = db.Column(db.String(255))             # 種類（ペットボトル、空き缶など）
     note = db.Column(db.Text)                        # 備考
 
+    # 利用可能時間 (CSVの文字列のまま。bin_hours.py で曜日 x 15分単位に変換する)
+    collection_type = db.Column(db.String(255))      # 回収形態
+    open_days = db.Column(db.String(255))            # 利用可能曜日
+    open_time = db.Column(db.String(32))             # 開始時間
+    close_time = db.Column(db.String(32))            # 終了時間
+    hours_note = db.Column(db.Text)                  # 利用可能時間特記事項
+
     def to_dict(self):
         # 全ての項目を返します
         return {
@@ -171,5 +190,10 @@ class TrashBin(db.Model):
             "latitude": self.latitude,
             "longitude": self.longitude,
             "bin_type": self.bin_type,
-            "note": self.note
+            "note": self.note,
+            "collection_type": self.collection_type,
+            "open_days": self.open_days,
+            "open_time": self.open_time,
+            "close_time": self.close_time,
+            "hours_note": self.hours_note
         }
\ No newline at end of file
@@ -0,0 +1,191 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from PIL import Image
+
+# ---------------------------------------------------------
+# AI判定結果のキャッシュ (画像の知覚ハッシュ + 言語 がキー)
+# 同じ物を撮った写真は dHash が数ビットしか違わないので、
+# ハミング距離がしきい値以内なら同じ画像とみなして前回のAI結果を返す。
+#
+#   PREDICTION_CACHE_SIZE      メモリに置く件数 (LRU, 既定 1024)
+#   PREDICTION_CACHE_DISTANCE  同じとみなすハミング距離 (0〜7, 既定 5)
+#   PREDICTION_CACHE_TTL       有効期限 秒 (既定 30日)
+#   PREDICTION_CACHE_PATH      SQLite ファイル。指定するとディスクにも保存し、
+#                              再起動後や他の gunicorn ワーカーとも共有する
+# ---------------------------------------------------------
+CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+MAX_DISTANCE = min(int(os.environ.get('PREDICTION_CACHE_DISTANCE', 5)), 7)
+TTL_SECONDS = int(os.environ.get('PREDICTION_CACHE_TTL', 30 * 24 * 3600))
+DB_PATH = os.environ.get('PREDICTION_CACHE_PATH')
+
+# 64ビットのハッシュを 8ビット x 8 個に分ける。
+# 距離が 7 以下なら、鳩の巣原理でどれか1つの区間は完全に一致する。
+NUM_BANDS = 8
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # (hash, lang) -> (created_at, result)
+_bands = {}                # (lang, 区間番号, 区間の値) -> {hash, ...}
+_db_ready = False
+
+
+def dhash(img, size=8):
+    """差分ハッシュ (dHash): 縮小したグレースケール画像の横方向の明暗差を64ビットにする"""
+    small = img.convert('L').resize((size + 1, size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _band_values(h):
+    return [(h >> (8 * i)) & 0xFF for i in range(NUM_BANDS)]
+
+
+def _distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+# ---------------------------------------------------------
+# メモリ (LRU)
+# ---------------------------------------------------------
+
+def _remember(h, lang, created_at, result):
+    key = (h, lang)
+    if key in _entries:
+        _entries.move_to_end(key)
+    _entries[key] = (created_at, result)
+    for i, band in enumerate(_band_values(h)):
+        _bands.setdefault((lang, i, band), set()).add(h)
+
+    while len(_entries) > CACHE_SIZE:
+        (old_h, old_lang), _ = _entries.popitem(last=False)
+        _forget_bands(old_h, old_lang)
+
+
+def _forget_bands(h, lang):
+    for i, band in enumerate(_band_values(h)):
+        bucket = _bands.get((lang, i, band))
+        if bucket:
+            bucket.discard(h)
+            if not bucket:
+                del _bands[(lang, i, band)]
+
+
+def _lookup_memory(h, lang):
+    candidates = set()
+    for i, band in enumerate(_band_values(h)):
+        candidates |= _bands.get((lang, i, band), set())
+
+    best = None
+    for other in candidates:
+        d = _distance(h, other)
+        if d <= MAX_DISTANCE and (best is None or d < best[0]):
+            best = (d, other)
+    if best is None:
+        return None
+
+    key = (best[1], lang)
+    created_at, result = _entries[key]
+    if time.time() - created_at > TTL_SECONDS:
+        del _entries[key]
+        _forget_bands(best[1], lang)
+        return None
+    _entries.move_to_end(key)
+    return result
+
+
+# ---------------------------------------------------------
+# ディスク (SQLite, 任意)
+# ---------------------------------------------------------
+
+def _connect():
+    global _db_ready
+    conn = sqlite3.connect(DB_PATH, timeout=5)
+    if not _db_ready:
+        # 複数ワーカーから同時に読み書きするので WAL モードにする
+        conn.execute("PRAGMA journal_mode=WAL")
+        band_cols = ", ".join(f"b{i} INTEGER" for i in range(NUM_BANDS))
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                hash TEXT NOT NULL, lang TEXT NOT NULL, {band_cols},
+                result TEXT NOT NULL, created_at REAL NOT NULL,
+                PRIMARY KEY (hash, lang)
+            )""")
+        for i in range(NUM_BANDS):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_prediction_cache_b{i} ON prediction_cache (lang, b{i})")
+        conn.commit()
+        _db_ready = True
+    return conn
+
+
+def _lookup_disk(h, lang):
+    bands = _band_values(h)
+    where = " OR ".join(f"b{i} = ?" for i in range(NUM_BANDS))
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            f"SELECT hash, result, created_at FROM prediction_cache WHERE lang = ? AND ({where}) AND created_at >= ?",
+            [lang, *bands, time.time() - TTL_SECONDS],
+        ).fetchall()
+
+    best = None
+    for hash_hex, result, created_at in rows:
+        other = int(hash_hex, 16)
+        d = _distance(h, other)
+        if d <= MAX_DISTANCE and (best is None or d < best[0]):
+            best = (d, other, created_at, json.loads(result))
+    return best
+
+
+def _store_disk(h, lang, created_at, result):
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, {', '.join('?' * NUM_BANDS)}, ?, ?)",
+            [f"{h:016x}", lang, *_band_values(h), json.dumps(result, ensure_ascii=False), created_at],
+        )
+
+
+# ---------------------------------------------------------
+# 公開関数
+# ---------------------------------------------------------
+
+def get(h, lang):
+    """近い画像のAI結果があれば返す (なければ None)"""
+    with _lock:
+        result = _lookup_memory(h, lang)
+    if result is not None or not DB_PATH:
+        return result
+
+    try:
+        found = _lookup_disk(h, lang)
+    except sqlite3.Error as e:
+        print(f"WARNING: prediction cache read failed: {e}")
+        return None
+    if found is None:
+        return None
+
+    _, other, created_at, result = found
+    with _lock:
+        _remember(other, lang, created_at, result)
+    return result
+
+
+def put(h, lang, result):
+    """AI結果を保存する"""
+    created_at = time.time()
+    with _lock:
+        _remember(h, lang, created_at, result)
+    if DB_PATH:
+        try:
+            _store_disk(h, lang, created_at, result)
+        except sqlite3.Error as e:
+            print(f"WARNING: prediction cache write failed: {e}")
@@ -0,0 +1,120 @@
+import os
+import queue
+import threading
+import time
+import uuid
+
+# ---------------------------------------------------------
+# AI判定の非同期ジョブ
+# gunicorn の sync ワーカーを AI の応答待ちで塞がないよう、
+# 画像を上限付きのキューに積んでバックグラウンドのスレッドで処理する。
+# 結果はジョブIDでポーリング (またはロングポーリング) して受け取る。
+#
+#   PREDICT_JOB_WORKERS     処理スレッド数 (既定 4)
+#   PREDICT_JOB_QUEUE_SIZE  待ち行列の上限 (既定 32)
+#   PREDICT_JOB_TTL         終わったジョブの結果を残す秒数 (既定 600秒)
+# ---------------------------------------------------------
+WORKERS = int(os.environ.get('PREDICT_JOB_WORKERS', 4))
+QUEUE_SIZE = int(os.environ.get('PREDICT_JOB_QUEUE_SIZE', 32))
+JOB_TTL = float(os.environ.get('PREDICT_JOB_TTL', 600))
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_jobs = {}             # job_id -> Job
+_jobs_lock = threading.Lock()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    """待ち行列がいっぱいで受け付けられない"""
+
+
+class Job:
+    def __init__(self, func, args):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.status = 'queued'      # queued -> running -> done / error
+        self.result = None
+        self.error = None           # (HTTPステータス, 本文)
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout):
+        return self._done.wait(timeout)
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.status = 'error' if error else 'done'
+        self.finished_at = time.time()
+        self._done.set()
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.status}
+        if self.status == 'done':
+            data["result"] = self.result
+        elif self.status == 'error':
+            data["error"] = self.error[1]
+        return data
+
+
+def _worker():
+    while True:
+        job = _queue.get()
+        try:
+            job.status = 'running'
+            job.finish(result=job.func(*job.args))
+        except Exception as e:
+            # func 側で (status, payload) を持つ例外を投げれば、それをそのまま返す
+            status = getattr(e, 'status', 500)
+            payload = getattr(e, 'payload', {"error": "INTERNAL_ERROR", "message": str(e)})
+            job.finish(error=(status, payload))
+        finally:
+            _queue.task_done()
+
+
+def _ensure_workers():
+    # gunicorn は import 後に fork するので、スレッドは最初のジョブ投入時に起動する
+    with _workers_lock:
+        if not _workers:
+            for i in range(WORKERS):
+                t = threading.Thread(target=_worker, name=f'predict-job-{i}', daemon=True)
+                t.start()
+                _workers.append(t)
+
+
+def _purge_expired():
+    now = time.time()
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.finished_at and now - job.finished_at > JOB_TTL]
+        for job_id in expired:
+            del _jobs[job_id]
+
+
+def submit(func, *args):
+    """func(*args) をジョブとして積み、Job を返す。いっぱいなら QueueFull"""
+    _ensure_workers()
+    _purge_expired()
+
+    job = Job(func, args)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    try:
+        _queue.put_nowait(job)
+    except queue.Full:
+        with _jobs_lock:
+            del _jobs[job.id]
+        raise QueueFull()
+    return job
+
+
+def get(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def queue_depth():
+    return _queue.qsize()
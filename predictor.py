@@ -0,0 +1,619 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from google.genai import types
+
+import data_loader
+import schedule_store
+import search_index
+import prediction_cache
+import image_preprocess
+import ai_fallback
+import gemini_pool
+import rate_limiter
+import ai_tiers
+import text_normalizer
+
+# ---------------------------------------------------------
+# AI判定の処理本体 (/api/predict_trash から切り出したもの)
+# Flask のリクエストに依存しないので、同期APIからも非同期ジョブからも呼べる。
+# ---------------------------------------------------------
+
+# AI判定で試すモデル (この順にフォールバック)
+AI_MODELS = ["gemini-flash-latest", "gemini-flash-lite-latest", "gemini-pro-latest"]
+
+# 画像判定1回あたりの見込みトークン数 (画像 + プロンプト + 回答)。実際の値は後で精算する
+ESTIMATED_TOKENS = 1000
+# クォータの枠が空くのを待つ最大秒数。0 なら待たずに次 (安い) のモデルへ回す
+RATE_MAX_WAIT = float(os.environ.get('AI_RATE_MAX_WAIT', 0))
+
+# テキスト判定1回あたりの見込みトークン数 (プロンプト + 回答)
+ESTIMATED_TEXT_TOKENS = 300
+
+# テキスト判定 (/api/classify_text) の設定
+#   CLASSIFY_TEXT_MIN_MATCH   辞書で決まったとみなす類似度 (これ未満ならAIに聞く, 既定 0.8)
+#   CLASSIFY_TEXT_CACHE_SIZE  正規化した質問ごとの結果を覚えておく件数 (LRU, 既定 2048)
+#   CLASSIFY_TEXT_CACHE_TTL   有効期限 秒 (既定 1日)
+TEXT_MIN_MATCH = float(os.environ.get('CLASSIFY_TEXT_MIN_MATCH', 0.8))
+TEXT_CACHE_SIZE = int(os.environ.get('CLASSIFY_TEXT_CACHE_SIZE', 2048))
+TEXT_CACHE_TTL = int(os.environ.get('CLASSIFY_TEXT_CACHE_TTL', 24 * 3600))
+
+# 途中までのJSONから読み取る項目 (値の文字列・数値が閉じているものだけ)
+_NAME_FIELD = re.compile(r'"identified_name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_TYPE_FIELD = re.compile(r'"type_id"\s*:\s*"?(\d+)(?=["\s,}])')
+
+_text_cache = OrderedDict()   # (正規化した質問, 言語) -> (作成時刻, AIの結果, モデル)
+_text_cache_lock = threading.Lock()
+
+# 言語設定のマッピング
+LANG_MAP = {
+    'ja': 'Japanese',
+    'en': 'English',
+    'zh': 'Simplified Chinese',
+    'ko': 'Korean',
+    'vi': 'Vietnamese',
+    'ru': 'Russian',
+    'id': 'Indonesian',
+}
+
+
+class PredictionError(Exception):
+    """判定できなかったときの例外 (HTTPステータスとレスポンス本文を持つ)"""
+
+    def __init__(self, status, payload, headers=None):
+        super().__init__(payload.get("message") or payload.get("error"))
+        self.status = status
+        self.payload = payload
+        self.headers = headers or {}
+
+
+def build_image_prompt(user_lang):
+    """画像判定用のプロンプト (指定言語での出力を強制する)"""
+    target_language = LANG_MAP.get(user_lang, 'Japanese')
+    type_legend = schedule_store.type_legend()
+    return f"""
+    Analyze this image and identify the trash item for waste sorting in Sapporo, Japan.
+
+    Target Language: {target_language} (All text values MUST be in this language)
+
+    Task 1: Identify the object name specifically in {target_language}.
+    Task 2: Classify into one of these types:
+        - Burnable (燃やせるゴミ)
+        - Spray Can (スプレー缶)
+        - Non-burnable (燃やせないゴミ)
+        - Lighter (ライター)
+        - Bottle/Cans/PET (びん・缶・ペットボトル)
+        - Battery (電池)
+        - Plastic Containers (容器包装プラスチック)
+        - Mixed Paper (雑がみ)
+        - Branches/Leaves (枝・葉・草)
+        - Oversized (大型ごみ)
+    Task 3: Provide a short reason for the classification in {target_language}.
+
+    Return ONLY a valid JSON object with these exact keys:
+    {{
+      "identified_name": "Name of the object in {target_language}",
+      "type_id": "Integer, one of ({type_legend})",
+      "type_name": "Name of the trash type in {target_language}",
+      "reason": "Reason in {target_language}"
+    }}
+    """
+
+
+def build_text_prompt(query, user_lang):
+    """品名だけで判定するプロンプト (画像なし)"""
+    target_language = LANG_MAP.get(user_lang, 'Japanese')
+    type_legend = schedule_store.type_legend()
+    return f"""
+    A user in Sapporo, Japan wants to throw away this item: "{query}"
+    Identify the item and classify it for waste sorting in Sapporo.
+
+    Target Language: {target_language} (All text values MUST be in this language)
+
+    Return ONLY a valid JSON object with these exact keys:
+    {{
+      "identified_name": "Name of the item in {target_language}",
+      "type_id": "Integer, one of ({type_legend})",
+      "type_name": "Name of the trash type in {target_language}",
+      "reason": "Reason in {target_language}"
+    }}
+    """
+
+
+def parse_json_text(text):
+    """マークダウンの削除処理 (壊れたJSONは例外になり、次のモデルへ回る)"""
+    return json.loads(text.replace('```json', '').replace('```', '').strip())
+
+
+def settle_tokens(model_name, response, estimated=ESTIMATED_TOKENS):
+    """見込みと実際のトークン数の差をクォータの枠に反映する"""
+    usage = getattr(response, 'usage_metadata', None)
+    total = getattr(usage, 'total_token_count', None)
+    if total:
+        rate_limiter.record_usage(model_name, total - estimated)
+
+
+def prepare_image(raw):
+    """向き補正・縮小・JPEG再圧縮 (スレッドプール) と知覚ハッシュの計算"""
+    try:
+        prepared = image_preprocess.submit(raw).result()
+        image_hash = prediction_cache.dhash(prepared.image)
+    except Exception:
+        raise PredictionError(400, {"error": "Invalid image file"})
+    return prepared, image_hash
+
+
+def raise_all_failed(e):
+    """全モデルが失敗したときの例外を PredictionError に置き換える"""
+    print(f"AI All Models Failed: {e.last_error}")
+    if isinstance(e.last_error, rate_limiter.RateLimited):
+        raise PredictionError(429, {
+            "error": "AI_LIMIT_OR_ERROR",
+            "message": str(e.last_error)
+        }, {"Retry-After": str(int(e.last_error.retry_after) + 1)})
+    raise PredictionError(503, {
+        "error": "AI_LIMIT_OR_ERROR",
+        "message": str(e.last_error)
+    })
+
+
+def run_models(call_model, models, deadline=None):
+    """持ち時間内で、遅いモデルには次のモデルを並列に投げる (ヘッジ)"""
+    deadline_seconds = None if deadline is None else deadline - time.monotonic()
+    try:
+        return ai_fallback.run_with_fallback(call_model, models, deadline_seconds=deadline_seconds)
+    except ai_fallback.AllModelsFailed as e:
+        raise_all_failed(e)
+
+
+def run_tiered(call_model, rules=None, deadline=None):
+    """
+    安いモデルから順に聞き、回答が検証を通らなければ次の段のモデルに聞き直す。
+    rules で聞き直す条件を変えられる (省略時は ai_tiers.ESCALATE_ON)。
+    同じ段のモデルが落ちていれば上の段へフォールバックする (その分は聞き直しに数えない)。
+    最上段まで聞いても通らなければ、最後の回答をそのまま使う。
+    deadline (time.monotonic() の時刻) はリクエスト全体の持ち時間で、全段で分け合う。
+    残りが次の段のモデルのいつもの応答時間 (ヘッジの待ち時間) より短ければ、聞き直さずに今の回答を使う。
+    """
+    if deadline is None:
+        deadline = time.monotonic() + ai_fallback.DEADLINE_SECONDS
+    tiers = ai_tiers.TIERS
+    answer = None
+    reasons = []
+    start = 0
+    while start < len(tiers):
+        models = gemini_pool.available_models(tiers[start:])
+        if not models:
+            break
+        try:
+            answer = ai_fallback.run_with_fallback(
+                call_model, models, deadline_seconds=deadline - time.monotonic())
+        except ai_fallback.AllModelsFailed as e:
+            # 下の段の回答があればそれを使い、なければエラーにする
+            if answer is None:
+                raise_all_failed(e)
+            break
+
+        reason = ai_tiers.escalation_reason(answer[0], rules)
+        next_tier = tiers.index(answer[1]) + 1
+        if reason is None or next_tier >= len(tiers):
+            break
+        remaining = deadline - time.monotonic()
+        if remaining < ai_fallback.hedge_delay(tiers[next_tier]):
+            print(f"DEBUG: Not escalating from {answer[1]} ({reason}, {remaining:.1f}s left)")
+            break
+        print(f"DEBUG: Escalating from {answer[1]} ({reason})")
+        reasons.append(reason)
+        start = next_tier
+
+    ai_tiers.record(answer[1], reasons)
+    return answer
+
+
+def call_ai(contents, estimated_tokens=ESTIMATED_TOKENS, rules=None):
+    """contents をAIに送り、(JSONを読んだ結果, 使ったモデル) を返す。失敗時は PredictionError"""
+    # 持ち時間はリクエスト全体で1つ (段階モードで聞き直しても延びない)
+    deadline = time.monotonic() + ai_fallback.DEADLINE_SECONDS
+    # 段階モードなら安いモデルから、そうでなければ AI_MODELS の順に試す
+    models = ai_tiers.TIERS if ai_tiers.TIERED else AI_MODELS
+    # 失敗が続いて休止中 (サーキットブレーカーが開いている) のモデルは最初から飛ばす
+    if not gemini_pool.available_models(models):
+        raise PredictionError(503, {
+            "error": "AI_LIMIT_OR_ERROR",
+            "message": "All models are cooling down"
+        }, {"Retry-After": str(int(gemini_pool.retry_after(models)) + 1)})
+
+    def call_model(model_name):
+        # 全ワーカー共通のクォータ枠を先に確保する (枠がなければ次のモデルへ)
+        rate_limiter.acquire(model_name, tokens=estimated_tokens,
+                             max_wait=min(RATE_MAX_WAIT, max(deadline - time.monotonic(), 0)))
+        # 持ち時間を過ぎたら結果は使われないので、HTTPの待ち時間も残りの持ち時間までにする
+        # (取り消せない呼び出しが、持ち時間を過ぎてまで接続とスレッドを使い続けないように)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("AI deadline exceeded")
+        # プロセス共通のクライアントで呼ぶ (接続を使い回し、成否をブレーカーに記録)
+        response = gemini_pool.generate_content(
+            model_name,
+            contents=contents,
+            # JSONモードを強制する設定（モデルによっては効かない場合もあるが念のため）
+            config={
+                'response_mime_type': 'application/json',
+                'http_options': {'timeout': max(int(remaining * 1000), 1)},
+            }
+        )
+        settle_tokens(model_name, response, estimated_tokens)
+        return parse_json_text(response.text)
+
+    if ai_tiers.TIERED:
+        return run_tiered(call_model, rules, deadline)
+    return run_models(call_model, gemini_pool.available_models(AI_MODELS), deadline)
+
+
+def ask_ai(prepared, image_hash, user_lang):
+    """
+    画像をAIに判定させ、(AIの結果, 使ったモデル, キャッシュから返したか) を返す。
+    似た画像を同じ言語で判定済みなら、AIを呼ばずに前回の結果を使う。
+    """
+    cached = prediction_cache.get(image_hash, user_lang)
+    if cached:
+        print(f"DEBUG: Prediction cache hit ({image_hash:016x})")
+        return cached["ai_result"], cached["model"], True
+
+    image_part = types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type)
+    ai_result, success_model = call_ai([image_part, build_image_prompt(user_lang)])
+
+    prediction_cache.put(image_hash, user_lang, {"ai_result": ai_result, "model": success_model})
+    return ai_result, success_model, False
+
+
+def dictionary_type_id(row):
+    """辞書の行の分別 (trash_type_str) を trash_types.id にする (分からなければ None)"""
+    return schedule_store.type_id_for_category(row.get('trash_type_str', ''))
+
+
+def build_result(ai_result, success_model, user_lang, area_id, from_cache=False, next_dates=None):
+    """
+    AIの結果を辞書と照合し、次回収集日を付けてアプリ向けの形にする。
+    next_dates (ゴミ種類ID -> 次回収集日) を渡すと、その地区の収集日をまとめて引いた結果を使う。
+    """
+    is_dictionary_match = False
+    confidence = 0.85  # 辞書で確認できなかった場合 (AIのみ) の値
+
+    # AIの結果を初期値としてセット
+    final_name = ai_result.get('identified_name', 'Unknown')
+    final_type_id = ai_result.get('type_id', 1)
+    final_type_id = int(final_type_id) if final_type_id is not None else None
+    final_type_name = ai_result.get('type_name', 'Unknown')
+    final_reason = ai_result.get('reason', '')
+
+    # 辞書検索（AIが出した名前を使って辞書にあるか確認）
+    # ※辞書にあれば、より正確な公式情報で上書きする
+    # どの言語の名前でも照合し、類似度をそのまま confidence に使う
+    # 似ているだけの品目 (「缶」->「缶切り」など) で上書きしないよう、ai_tiers.MIN_MATCH 未満ならAIの回答のまま
+    match = data_loader.match_dictionary(final_name, min_score=ai_tiers.MIN_MATCH)
+    dict_match = match["row"] if match and match["score"] >= ai_tiers.MIN_MATCH else None
+
+    if dict_match:
+        is_dictionary_match = True
+        confidence = round(match["score"], 2)
+        name_col = f"name_{user_lang}" if user_lang != 'zh' else 'name_zh_cn'
+        # 辞書にその言語の名前があれば上書き、なければ英語、それもなければAIの結果を維持
+        dict_name = dict_match.get(name_col) or dict_match.get('name_en')
+        if dict_name:
+            final_name = dict_name
+
+        # 「辞書の分別ID」を正とする (表示名はAIの翻訳済み type_name を維持)
+        # ゴミ種類IDのない分別 (スプレー缶・ライター など) は、AIの type_id ではなく辞書の分別名を返す
+        dict_type_id = dictionary_type_id(dict_match)
+        if dict_type_id is not None:
+            final_type_id = dict_type_id
+        else:
+            final_type_id = None
+            final_type_name = dict_match.get('trash_type_str', '') or final_type_name
+
+        note_col = 'note_ja' if user_lang == 'ja' else 'note_en'
+        dict_note = dict_match.get(note_col)
+        if dict_note:
+            final_reason = dict_note # 辞書の備考があれば理由として上書き
+
+    # スケジュール計算
+    schedule_date = None
+    if next_dates is not None:
+        next_date = next_dates.get(final_type_id)
+        if next_date:
+            schedule_date = next_date.strftime("%Y-%m-%d")
+    elif area_id and final_type_id:
+        try:
+            schedule_store.ensure_loaded()
+            next_date = schedule_store.get_next_date(int(area_id), final_type_id)
+            if next_date:
+                schedule_date = next_date.strftime("%Y-%m-%d")
+        except:
+            pass
+
+    # JSONのキー名はフロントエンド(camera_screen.dart)に合わせて返す
+    return {
+        "name": final_name,
+        "type_id": final_type_id,
+        "type": final_type_name,
+        "reason": final_reason,
+        "confidence": confidence,
+        "collection_schedule": schedule_date,
+        "is_dictionary_match": is_dictionary_match,
+        "model_used": success_model,
+        "from_cache": from_cache
+    }
+
+
+def predict(raw, area_id, user_lang):
+    """画像のバイト列から判定結果 (dict) を作る。失敗時は PredictionError"""
+    prepared, image_hash = prepare_image(raw)
+    ai_result, success_model, from_cache = ask_ai(prepared, image_hash, user_lang)
+    return build_result(ai_result, success_model, user_lang, area_id, from_cache)
+
+
+# ---------------------------------------------------------
+# まとめて判定 (/api/predict_trash/batch)
+# 複数の画像 (または1枚に写った複数の品物) を1回のAI呼び出しで判定する。
+#   PREDICT_BATCH_MAX_IMAGES  1回に受け付ける画像の枚数 (既定 8)
+# ---------------------------------------------------------
+BATCH_MAX_IMAGES = int(os.environ.get('PREDICT_BATCH_MAX_IMAGES', 8))
+
+
+def build_batch_prompt(num_images, user_lang):
+    """複数の画像・品物をまとめて判定するプロンプト"""
+    target_language = LANG_MAP.get(user_lang, 'Japanese')
+    type_legend = schedule_store.type_legend()
+    return f"""
+    You are given {num_images} image(s), numbered from 0 in the order they were sent.
+    Identify EVERY distinct trash item visible in each image for waste sorting in Sapporo, Japan.
+
+    Target Language: {target_language} (All text values MUST be in this language)
+
+    Return ONLY a valid JSON object with this exact shape:
+    {{
+      "items": [
+        {{
+          "image_index": "Integer index of the image the item appears in",
+          "identified_name": "Name of the object in {target_language}",
+          "type_id": "Integer, one of ({type_legend})",
+          "type_name": "Name of the trash type in {target_language}",
+          "reason": "Reason in {target_language}"
+        }}
+      ]
+    }}
+    """
+
+
+def prepare_images(raws):
+    """複数の画像を並列に前処理する (読めない画像があれば、その番号付きで 400)"""
+    futures = [image_preprocess.submit(raw) for raw in raws]
+    prepared = []
+    for index, future in enumerate(futures):
+        try:
+            prepared.append(future.result())
+        except Exception:
+            raise PredictionError(400, {"error": "Invalid image file", "image_index": index})
+    return prepared
+
+
+def predict_batch(raws, area_id, user_lang):
+    """
+    複数の画像から品物ごとの判定結果を作る。
+    AIは1回だけ呼び、辞書照合と次回収集日は品物ごとにまとめて引く。
+    """
+    if not raws:
+        raise PredictionError(400, {"error": "No image part"})
+    if len(raws) > BATCH_MAX_IMAGES:
+        raise PredictionError(400, {"error": f"Too many images (max {BATCH_MAX_IMAGES})"})
+
+    prepared = prepare_images(raws)
+    contents = [types.Part.from_bytes(data=p.data, mime_type=p.mime_type) for p in prepared]
+    contents.append(build_batch_prompt(len(prepared), user_lang))
+
+    # 回答は品物のリストなので、1件ずつの検証による聞き直しはしない
+    answer, success_model = call_ai(contents, ESTIMATED_TOKENS * len(prepared), rules=set())
+    ai_items = answer.get('items', []) if isinstance(answer, dict) else answer
+
+    # 地区の次回収集日は1回だけ引き、全品物で使い回す
+    next_dates = {}
+    if area_id:
+        try:
+            schedule_store.ensure_loaded()
+            next_dates = schedule_store.get_next_dates(int(area_id))
+        except Exception:
+            pass
+
+    items = []
+    for ai_item in ai_items if isinstance(ai_items, list) else []:
+        try:
+            result = build_result(ai_item, success_model, user_lang, area_id, next_dates=next_dates)
+        except (AttributeError, TypeError, ValueError):
+            continue  # 形の崩れた品物は飛ばす
+        try:
+            result["image_index"] = int(ai_item.get('image_index', 0))
+        except (TypeError, ValueError):
+            result["image_index"] = 0
+        items.append(result)
+
+    return {"items": items, "model_used": success_model}
+
+
+# ---------------------------------------------------------
+# ストリーミングでの判定 (/api/predict_trash/stream)
+# 回答の JSON を流し読みし、名前と type_id が読めた時点で先に返す。
+# ---------------------------------------------------------
+
+def read_partial_fields(text):
+    """途中までのJSONから identified_name と type_id が両方読めれば dict を返す"""
+    name = _NAME_FIELD.search(text)
+    type_id = _TYPE_FIELD.search(text)
+    if not (name and type_id):
+        return None
+    try:
+        return {"identified_name": json.loads(f'"{name.group(1)}"'), "type_id": int(type_id.group(1))}
+    except ValueError:
+        return None
+
+
+def stream_model(model_name, contents):
+    """
+    1つのモデルの回答を流し読みするジェネレーター。
+    名前と type_id が読めたら ('partial', 項目) を、最後に ('done', JSONを読んだ結果) を返す。
+    """
+    rate_limiter.acquire(model_name, tokens=ESTIMATED_TOKENS, max_wait=RATE_MAX_WAIT)
+    started = time.monotonic()
+    text = ""
+    last_chunk = None
+    partial_sent = False
+    for chunk in gemini_pool.generate_content_stream(
+        model_name,
+        contents=contents,
+        config={'response_mime_type': 'application/json'}
+    ):
+        last_chunk = chunk
+        text += chunk.text or ""
+        if not partial_sent:
+            fields = read_partial_fields(text)
+            if fields:
+                partial_sent = True
+                yield 'partial', fields
+    if last_chunk is not None:
+        settle_tokens(model_name, last_chunk)
+    ai_fallback.record_latency(model_name, time.monotonic() - started)
+    yield 'done', parse_json_text(text)
+
+
+def stream_ai(contents):
+    """
+    モデルを順に流し読みし、途中経過を ('partial', ...) で返しながら (AIの結果, モデル) を return する。
+    途中で失敗したら次のモデルで最初からやり直す (ヘッジや聞き直しはしない)。
+    """
+    models = gemini_pool.available_models(ai_tiers.TIERS if ai_tiers.TIERED else AI_MODELS)
+    last_error = RuntimeError("no models to try")
+    for model_name in models:
+        print(f"DEBUG: Streaming AI Model -> {model_name}")
+        partial_sent = False
+        try:
+            for kind, value in stream_model(model_name, contents):
+                if kind == 'partial':
+                    partial_sent = True
+                    yield 'partial', {"name": value["identified_name"], "type_id": value["type_id"],
+                                      "model_used": model_name}
+                else:
+                    ai_result = value
+        except Exception as e:
+            print(f"DEBUG: Streaming {model_name} failed: {e}")
+            last_error = e
+            continue
+
+        if not partial_sent:
+            yield 'partial', {"name": ai_result.get('identified_name', 'Unknown'),
+                              "type_id": ai_result.get('type_id'), "model_used": model_name}
+        return ai_result, model_name
+    raise_all_failed(ai_fallback.AllModelsFailed(last_error))
+
+
+def predict_stream(raw, area_id, user_lang):
+    """
+    画像を判定し、(イベント名, データ) を順に返すジェネレーター。
+      partial     AIの名前と type_id (回答を読み終わる前に届く)
+      dictionary  辞書で上書きした名前・分別・理由・confidence
+      schedule    次回収集日
+      result      predict と同じ形の最終結果
+    最初のイベントまでに判定できないと分かった場合は PredictionError を投げる。
+    """
+    prepared, image_hash = prepare_image(raw)
+
+    cached = prediction_cache.get(image_hash, user_lang)
+    if cached:
+        ai_result, success_model, from_cache = cached["ai_result"], cached["model"], True
+        yield 'partial', {"name": ai_result.get('identified_name', 'Unknown'),
+                          "type_id": ai_result.get('type_id'), "model_used": success_model}
+    else:
+        image_part = types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type)
+        ai_result, success_model = yield from stream_ai([image_part, build_image_prompt(user_lang)])
+        from_cache = False
+        prediction_cache.put(image_hash, user_lang, {"ai_result": ai_result, "model": success_model})
+
+    result = build_result(ai_result, success_model, user_lang, area_id, from_cache)
+    yield 'dictionary', {key: result[key] for key in
+                         ("name", "type_id", "type", "reason", "confidence", "is_dictionary_match")}
+    yield 'schedule', {"collection_schedule": result["collection_schedule"]}
+    yield 'result', result
+
+
+# ---------------------------------------------------------
+# テキスト (品名) での判定
+# ---------------------------------------------------------
+
+def _text_cache_get(key):
+    with _text_cache_lock:
+        entry = _text_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > TEXT_CACHE_TTL:
+            del _text_cache[key]
+            return None
+        _text_cache.move_to_end(key)
+        return entry[1], entry[2]
+
+
+def _text_cache_put(key, ai_result, model_name):
+    with _text_cache_lock:
+        _text_cache[key] = (time.time(), ai_result, model_name)
+        _text_cache.move_to_end(key)
+        while len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+
+
+def ask_text(query, user_lang, limiter=None):
+    """
+    品名を判定し、(AIの結果と同じ形の dict, 使ったモデル, キャッシュから返したか) を返す。
+    辞書で決まればAIは呼ばない (モデル名は "dictionary")。
+    """
+    # 全角/半角・大文字/小文字・空白の違いは同じ質問とみなす
+    key = (" ".join(text_normalizer.normalize(query).split()), user_lang)
+    cached = _text_cache_get(key)
+    if cached:
+        return cached[0], cached[1], True
+
+    # まず検索と同じキー (表記・ひらがな・ローマ字) で品名を引き、当たればその辞書名で照合する
+    # (例: "petto botoru" -> ペットボトル)
+    hit = search_index.lookup(query)
+    name = hit["name_ja"] if hit else query
+    match = data_loader.match_dictionary(name, min_score=TEXT_MIN_MATCH)
+    if match and match["score"] >= TEXT_MIN_MATCH:
+        # 収集区分がゴミ種類IDにない分別 (スプレー缶・ライター・市で収集しないもの など) は
+        # type_id を None にして、辞書の分別名をそのまま返す (燃やせるごみ などと推測しない)
+        type_id = dictionary_type_id(match["row"])
+        ai_result = {
+            "identified_name": name,
+            "type_id": type_id,
+            "type_name": (type_id is not None and schedule_store.get_type_name(type_id, user_lang))
+                         or match["row"].get('trash_type_str', ''),
+            "reason": "",
+        }
+        success_model = "dictionary"
+    else:
+        # 辞書にない品名だけAIに聞く (辞書で確認できないのは分かっているので、それでは聞き直さない)
+        rules = ai_tiers.ESCALATE_ON - {'no_dictionary'}
+        with limiter or nullcontext():
+            ai_result, success_model = call_ai(
+                [build_text_prompt(query, user_lang)], ESTIMATED_TEXT_TOKENS, rules
+            )
+
+    _text_cache_put(key, ai_result, success_model)
+    return ai_result, success_model, False
+
+
+def classify_text(query, area_id, user_lang, limiter=None):
+    """品名から判定結果 (predict と同じ形の dict) を作る。失敗時は PredictionError"""
+    ai_result, success_model, from_cache = ask_text(query, user_lang, limiter)
+    return build_result(ai_result, success_model, user_lang, area_id, from_cache)
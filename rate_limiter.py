@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+# ---------------------------------------------------------
+# Gemini のクォータ (RPM / TPM) に合わせたトークンバケット
+# 状態を SQLite ファイルに置くので、gunicorn の全ワーカーと
+# translate_all.py のようなバッチスクリプトが同じ枠を分け合う。
+# 例外で制限を知ってから待つのではなく、投げる前に枠があるか確認する。
+#
+#   AI_RATE_LIMITS   モデルごとの上限 (JSON) 例: {"gemini-flash-latest": {"rpm": 10, "tpm": 250000}}
+#   AI_RATE_DB_PATH  状態を置く SQLite ファイル (既定 一時ディレクトリ/banana_rate_limits.db)
+# ---------------------------------------------------------
+DEFAULT_LIMITS = {
+    "gemini-flash-latest": {"rpm": 10, "tpm": 250000},
+    "gemini-flash-lite-latest": {"rpm": 15, "tpm": 250000},
+    "gemini-pro-latest": {"rpm": 5, "tpm": 250000},
+}
+LIMITS = {**DEFAULT_LIMITS, **json.loads(os.environ.get('AI_RATE_LIMITS', '{}'))}
+DB_PATH = os.environ.get('AI_RATE_DB_PATH') or os.path.join(tempfile.gettempdir(), 'banana_rate_limits.db')
+
+_db_ready = False
+
+
+class RateLimited(Exception):
+    """枠が空くまで retry_after 秒かかる"""
+
+    def __init__(self, model_name, retry_after):
+        super().__init__(f"429 rate limit for {model_name} (retry after {retry_after:.1f}s)")
+        self.model_name = model_name
+        self.retry_after = retry_after
+
+
+def _connect():
+    global _db_ready
+    # 自分で BEGIN IMMEDIATE を出して、ワーカー間の読み書きを直列化する
+    conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+    if not _db_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                model TEXT NOT NULL, kind TEXT NOT NULL,
+                tokens REAL NOT NULL, updated_at REAL NOT NULL,
+                PRIMARY KEY (model, kind)
+            )""")
+        _db_ready = True
+    return conn
+
+
+def _buckets(model_name, tokens):
+    """(種類, 容量, 1秒あたりの補充量, 今回使う量) の一覧"""
+    limits = LIMITS.get(model_name, {})
+    buckets = []
+    if limits.get('rpm'):
+        buckets.append(('rpm', limits['rpm'], limits['rpm'] / 60.0, 1))
+    if limits.get('tpm'):
+        buckets.append(('tpm', limits['tpm'], limits['tpm'] / 60.0, min(tokens, limits['tpm'])))
+    return buckets
+
+
+def _take(conn, model_name, tokens):
+    """
+    1回のトランザクションで補充と消費を行う。
+    足りれば 0 を、足りなければ空くまでの秒数を返す (その場合は消費しない)。
+    """
+    buckets = _buckets(model_name, tokens)
+    if not buckets:
+        return 0.0
+
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        levels = {}
+        wait = 0.0
+        for kind, capacity, rate, cost in buckets:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE model = ? AND kind = ?",
+                (model_name, kind),
+            ).fetchone()
+            level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            levels[kind] = level
+            if level < cost:
+                wait = max(wait, (cost - level) / rate)
+
+        if wait == 0.0:
+            for kind, capacity, rate, cost in buckets:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?, ?)",
+                    (model_name, kind, levels[kind] - cost, now),
+                )
+        conn.execute("COMMIT")
+        return wait
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def acquire(model_name, tokens=1000, max_wait=0.0):
+    """
+    model_name を1回呼ぶ枠 (リクエスト1回 + 見込みトークン数) を確保する。
+    max_wait 秒までは空くのを待ち、それでも足りなければ RateLimited を投げる。
+    (max_wait=0 なら待たずにすぐ失敗 -> 呼び出し側で安いモデルに切り替えるなどできる)
+    """
+    deadline = time.monotonic() + max_wait
+    while True:
+        try:
+            with closing(_connect()) as conn:
+                wait = _take(conn, model_name, tokens)
+        except sqlite3.Error as e:
+            # 状態ファイルが使えないときは制限せずに通す (判定自体は止めない)
+            print(f"WARNING: rate limiter unavailable: {e}")
+            return
+        if wait == 0.0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimited(model_name, wait)
+        time.sleep(wait)
+
+
+def record_usage(model_name, extra_tokens):
+    """実際に使ったトークン数が見込みより多かった分を後から差し引く (少なければ戻す)"""
+    limits = LIMITS.get(model_name, {})
+    if not limits.get('tpm') or not extra_tokens:
+        return
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "UPDATE rate_buckets SET tokens = MIN(tokens - ?, ?) WHERE model = ? AND kind = 'tpm'",
+                (extra_tokens, limits['tpm'], model_name),
+            )
+    except sqlite3.Error as e:
+        print(f"WARNING: rate limiter unavailable: {e}")
+
+
+def status():
+    """
+    各モデルのバケットの残り (補充を反映した値)。
+    状態ファイルが使えなければ {"available": False, "error": ...} を返す (acquire は制限せずに通している)
+    """
+    now = time.time()
+    result = {}
+    try:
+        with closing(_connect()) as conn:
+            rows = conn.execute("SELECT model, kind, tokens, updated_at FROM rate_buckets").fetchall()
+    except sqlite3.Error as e:
+        print(f"WARNING: rate limiter unavailable: {e}")
+        return {"available": False, "error": str(e)}
+    for model_name, kind, tokens, updated_at in rows:
+        capacity = LIMITS.get(model_name, {}).get(kind)
+        if not capacity:
+            continue
+        level = min(capacity, tokens + (now - updated_at) * capacity / 60.0)
+        result.setdefault(model_name, {})[kind] = {"available": round(level, 1), "limit": capacity}
+    return result
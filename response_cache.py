@@ -0,0 +1,75 @@
+import gzip
+import hashlib
+import json
+
+from flask import Response, request
+
+# brotli は任意 (インストールされていなければ gzip のみで配信する)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ---------------------------------------------------------
+# 事前シリアライズ済みレスポンスのキャッシュ
+# データが変わらない限り同じ JSON を返すAPI向けに、
+# JSON文字列・gzip・brotli をあらかじめ作っておき、ETag で 304 を返す。
+# ---------------------------------------------------------
+_entries = {}   # key -> {"etag", "identity", "gzip", "br"}
+
+
+def build_entry(payload):
+    """payload を JSON にして、圧縮済みのバリエーションと ETag を作る"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    entry = {
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=9),
+        "br": brotli.compress(body, quality=11) if brotli else None,
+    }
+    return entry
+
+
+def get_or_build(key, builder):
+    """key のエントリがなければ builder() の結果から作って保存する"""
+    entry = _entries.get(key)
+    if entry is None:
+        entry = build_entry(builder())
+        _entries[key] = entry
+    return entry
+
+
+def clear():
+    """データを入れ替えたとき (seed 後など) に呼ぶ"""
+    _entries.clear()
+
+
+def _choose_encoding(entry):
+    accept = request.accept_encodings
+    if entry["br"] is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return 'identity'
+
+
+def make_response(entry, cache_control='no-cache'):
+    """
+    Accept-Encoding に合わせて圧縮済みの本文を返す。
+    If-None-Match が一致すれば本文なしの 304 を返す。
+    """
+    encoding = _choose_encoding(entry)
+    # 強い ETag は表現ごとに別の値にする (圧縮方式をサフィックスで区別)
+    etag = entry["etag"] if encoding == 'identity' else f"{entry['etag']}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry[encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
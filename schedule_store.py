@@ -0,0 +1,180 @@
+import bisect
+import datetime
+from array import array
+from collections import defaultdict
+
+from models import db, Schedule, TrashType
+
+# ---------------------------------------------------------
+# 収集スケジュールのメモリ常駐ストア
+# (エリア × 日付) の int8 配列に trash_type_id を詰めて保持する。
+# 0 は「収集なし」を表す。
+# ゴミ種別 (trash_types) の名前もここに持ち、辞書の分別名 -> trash_types.id の変換と
+# AIのプロンプトに書く type_id の一覧は、すべてこの表から作る。
+# ---------------------------------------------------------
+_matrix = array('b')
+_area_rows = {}        # area_id -> 行番号
+_start_date = None     # 配列の 0 列目に対応する日付
+_num_days = 0
+_date_index = {}       # area_id -> {trash_type_id: 昇順の日付リスト}
+_type_names = {}       # trash_type_id -> {"name_ja": ..., "name_en": ...}
+
+NAME_COLUMNS = ['name_ja', 'name_en', 'name_zh_cn', 'name_ko', 'name_vi', 'name_ru', 'name_id']
+
+
+def build(rows):
+    """
+    (area_id, date, trash_type_id) のイテラブルから配列を組み立てる。
+    日付は最小日〜最大日の連続した範囲として確保する。
+    """
+    global _matrix, _area_rows, _start_date, _num_days, _date_index
+
+    rows = [(a, d, t) for a, d, t in rows if d is not None and t]
+    if not rows:
+        _matrix, _area_rows, _start_date, _num_days = array('b'), {}, None, 0
+        _date_index = {}
+        return 0
+
+    start = min(d for _, d, _ in rows)
+    end = max(d for _, d, _ in rows)
+    num_days = (end - start).days + 1
+    area_rows = {a: i for i, a in enumerate(sorted({a for a, _, _ in rows}))}
+
+    matrix = array('b', bytes(len(area_rows) * num_days))
+    date_index = defaultdict(lambda: defaultdict(list))
+    for area_id, date, type_id in rows:
+        matrix[area_rows[area_id] * num_days + (date - start).days] = type_id
+        date_index[area_id][type_id].append(date)
+    for by_type in date_index.values():
+        for dates in by_type.values():
+            dates.sort()
+
+    # 組み立て終わってからまとめて差し替える (読み取り側に途中状態を見せない)
+    _matrix, _area_rows, _start_date, _num_days = matrix, area_rows, start, num_days
+    _date_index = {a: dict(by_type) for a, by_type in date_index.items()}
+    return len(rows)
+
+
+def load_type_names():
+    """DBの trash_types テーブルを読み込む"""
+    global _type_names
+    _type_names = {
+        t.id: {col: getattr(t, col) for col in NAME_COLUMNS}
+        for t in TrashType.query.all()
+    }
+
+
+def ensure_type_names():
+    """ゴミ種別をまだ読んでいなければ読む (DBに繋がらなければ空のまま)"""
+    if _type_names:
+        return
+    try:
+        load_type_names()
+    except Exception as e:
+        db.session.rollback()
+        print(f"WARNING: trash types not loaded: {e}")
+
+
+def load_from_db():
+    """DBの schedules テーブルを1回だけ読み込んで配列を作り直す"""
+    load_type_names()
+
+    rows = db.session.query(
+        Schedule.area_id, Schedule.date, Schedule.trash_type_id
+    ).all()
+    count = build(rows)
+    print(f"✔ Schedule store: {count} entries ({len(_area_rows)} areas x {_num_days} days).")
+    return count
+
+
+def is_loaded():
+    return _start_date is not None
+
+
+def ensure_loaded():
+    """起動時に読めなかった場合 (seed 前など) はここで読み直す"""
+    if not is_loaded():
+        load_from_db()
+
+
+def get_type_name(type_id, lang):
+    """ゴミ種別名を言語に応じて返す (なければ日本語)"""
+    names = _type_names.get(type_id)
+    if not names:
+        return ""
+    col = 'name_zh_cn' if lang == 'zh' else f"name_{lang}"
+    return names.get(col) or names.get('name_ja') or ""
+
+
+def type_ids():
+    """trash_types.id の一覧 (昇順)"""
+    ensure_type_names()
+    return sorted(_type_names)
+
+
+def type_id_for_category(category):
+    """
+    辞書の分別名 (trash_type_str) を trash_types.id にする (該当する種別がなければ None)。
+    「びん・缶・ペットボトル」と「びん・缶・ペット」のように、種別名で始まる分別名は同じ種別とみなす。
+    """
+    ensure_type_names()
+    category = (category or '').strip()
+    best_id, best_name = None, ''
+    for type_id, names in _type_names.items():
+        name = names.get('name_ja') or ''
+        if name and category.startswith(name) and len(name) > len(best_name):
+            best_id, best_name = type_id, name
+    return best_id
+
+
+def type_legend():
+    """AIのプロンプトに書く type_id の一覧 (例: 1:Burnable (燃やせるごみ), 8:Bottles/Cans (びん・缶・ペット), ...)"""
+    ensure_type_names()
+    return ", ".join(
+        f"{type_id}:{names.get('name_en') or names.get('name_ja')} ({names.get('name_ja')})"
+        for type_id, names in sorted(_type_names.items())
+    )
+
+
+def get_range(area_id, start, end):
+    """
+    指定エリアの start〜end (両端含む) の収集日を
+    [(date, trash_type_id), ...] で返す。収集なしの日は含めない。
+    """
+    row = _area_rows.get(area_id)
+    if row is None or _start_date is None:
+        return []
+
+    first = max((start - _start_date).days, 0)
+    last = min((end - _start_date).days, _num_days - 1)
+    if first > last:
+        return []
+
+    base = row * _num_days
+    window = _matrix[base + first:base + last + 1]
+    return [
+        (_start_date + datetime.timedelta(days=first + i), type_id)
+        for i, type_id in enumerate(window)
+        if type_id
+    ]
+
+
+def get_next_date(area_id, type_id, today=None):
+    """指定エリア・ゴミ種別の today 以降で直近の収集日を二分探索で返す"""
+    dates = _date_index.get(area_id, {}).get(type_id)
+    if not dates:
+        return None
+    today = today or datetime.date.today()
+    i = bisect.bisect_left(dates, today)
+    return dates[i] if i < len(dates) else None
+
+
+def get_next_dates(area_id, today=None):
+    """指定エリアの全ゴミ種別について直近の収集日を {trash_type_id: date} で返す"""
+    today = today or datetime.date.today()
+    result = {}
+    for type_id, dates in _date_index.get(area_id, {}).items():
+        i = bisect.bisect_left(dates, today)
+        if i < len(dates):
+            result[type_id] = dates[i]
+    return result
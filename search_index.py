@@ -0,0 +1,171 @@
+import bisect
+from collections import defaultdict
+
+from sqlalchemy.orm import joinedload
+
+from models import db, TrashDictionary
+from text_normalizer import normalize, entry_keys, query_keys
+
+# ---------------------------------------------------------
+# 分別辞書の前方一致検索インデックス (メモリ常駐)
+# 言語ごとに (正規化したキー, 行番号) の昇順リストを持ち、
+# 前方一致は二分探索で範囲を切り出して答える。
+# キーはカタカナ/半角カナ/全角英字/ローマ字の入力でも当たるよう text_normalizer で作る。
+# ---------------------------------------------------------
+LANG_COLUMNS = {
+    'ja': 'name_ja', 'en': 'name_en', 'zh': 'name_zh_cn', 'ko': 'name_ko',
+    'vi': 'name_vi', 'ru': 'name_ru', 'id': 'name_id',
+}
+TEXT_COLUMNS = [f"{base}_{suffix}" for base in ('name', 'note')
+                for suffix in ('ja', 'en', 'zh_cn', 'ko', 'vi', 'ru', 'id')]
+
+_rows = []             # 辞書1件ごとの dict (name_kana 順)
+_keys = {}             # lang -> [(key, 行番号), ...] (key 昇順)
+_by_type = {}          # trash_type_id -> [行番号, ...] (name_kana 順)
+_loaded = False
+
+
+def index_keys(row, lang):
+    """
+    1件の辞書データから、その言語で前方一致の対象にするキーを返す。
+    日本語の表記・ひらがな・ローマ字はどの言語でも対象にする。
+    """
+    keys = set(row["ja_keys"])
+    col = LANG_COLUMNS.get(lang)
+    if col:
+        keys.add(normalize(row.get(col)))
+    keys.discard("")
+    return keys
+
+
+def build(rows):
+    """name_kana 順に並んだ辞書データの dict リストからインデックスを作る"""
+    global _rows, _keys, _by_type, _loaded
+
+    for row in rows:
+        if "ja_keys" not in row:
+            row["ja_keys"] = entry_keys(row.get('name_ja'), row.get('name_kana'))
+
+    keys = {}
+    for lang in LANG_COLUMNS:
+        pairs = []
+        for i, row in enumerate(rows):
+            pairs.extend((key, i) for key in index_keys(row, lang))
+        pairs.sort()
+        keys[lang] = pairs
+
+    by_type = defaultdict(list)
+    for i, row in enumerate(rows):
+        by_type[row.get('trash_type_id')].append(i)
+
+    _rows, _keys, _by_type, _loaded = rows, keys, dict(by_type), True
+
+
+def load_from_db():
+    """TrashDictionary を1回だけ読み込んでインデックスを作り直す"""
+    items = TrashDictionary.query.options(
+        joinedload(TrashDictionary.trash_type)
+    ).order_by(TrashDictionary.name_kana.asc()).all()
+
+    rows = []
+    for item in items:
+        row = {col: getattr(item, col) for col in TEXT_COLUMNS}
+        row.update({
+            "id": item.id,
+            "name_kana": item.name_kana,
+            "trash_type_id": item.trash_type_id,
+            "type_names": {},
+        })
+        if item.trash_type:
+            row["type_names"] = {
+                col: getattr(item.trash_type, col)
+                for col in TEXT_COLUMNS if col.startswith('name_')
+            }
+        rows.append(row)
+
+    build(rows)
+    print(f"✔ Search index: {len(rows)} dictionary items.")
+
+
+def ensure_loaded():
+    """起動時に読めなかった場合 (seed 前など) はここで読み直す"""
+    if not _loaded:
+        load_from_db()
+
+
+def _localized(values, base, lang):
+    """app.get_translated_value と同じ規則で、言語の値がなければ日本語を返す"""
+    col = f"{base}_zh_cn" if lang == 'zh' else f"{base}_{lang}"
+    val = values.get(col)
+    if val and str(val).strip():
+        return val
+    return values.get(f"{base}_ja") or ''
+
+
+def _prefix_rows(pairs, prefix):
+    """昇順リストから prefix で始まるキーの行番号を集める"""
+    start = bisect.bisect_left(pairs, (prefix,))
+    hits = set()
+    for key, i in pairs[start:]:
+        if not key.startswith(prefix):
+            break
+        hits.add(i)
+    return hits
+
+
+def lookup(query):
+    """
+    日本語の表記・ひらがな・ローマ字のどれかが query と完全に一致する辞書データを1件返す
+    (複数あれば name_kana 順で最初のもの。なければ None)。
+    インデックスを読めなければ (DBに繋がらないなど) None を返す。
+    """
+    if not _loaded:
+        try:
+            load_from_db()
+        except Exception as e:
+            db.session.rollback()
+            print(f"WARNING: search index not loaded: {e}")
+            return None
+    pairs = _keys.get('ja', [])
+    hits = []
+    for key in query_keys(query):
+        i = bisect.bisect_left(pairs, (key,))
+        if i < len(pairs) and pairs[i][0] == key:
+            hits.append(pairs[i][1])
+    return _rows[min(hits)] if hits else None
+
+
+def search(query, lang='ja', cat_id=None, limit=50):
+    """
+    前方一致検索。cat_id があればゴミ種別で絞り込む。
+    結果は name_kana 順に最大 limit 件 (日本語以外は名前順に並べ直す)。
+    """
+    pairs = _keys.get(lang, _keys.get('ja', []))
+    prefixes = query_keys(query)
+
+    if prefixes:
+        hits = set()
+        for prefix in prefixes:
+            hits |= _prefix_rows(pairs, prefix)
+        if cat_id is not None:
+            hits = {i for i in hits if _rows[i].get('trash_type_id') == cat_id}
+        indices = sorted(hits)[:limit]
+    elif cat_id is not None:
+        indices = _by_type.get(cat_id, [])[:limit]
+    else:
+        indices = list(range(min(limit, len(_rows))))
+
+    result = []
+    for i in indices:
+        row = _rows[i]
+        result.append({
+            "id": row["id"],
+            "name": _localized(row, 'name', lang),
+            "type": _localized(row["type_names"], 'name', lang) if row["type_names"] else "",
+            "note": _localized(row, 'note', lang),
+            "trash_type_id": row["trash_type_id"],
+        })
+
+    if lang != 'ja':
+        result.sort(key=lambda x: x['name'].upper())
+    return result
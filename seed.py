@@ -10,6 +10,10 @@ import re
 import pykakasi  
 from app import app
 from models import db, Area, TrashType, Schedule, TrashDictionary, TrashBin
+import schedule_store
+import response_cache
+import search_index
+import bin_index
 
 def seed_data():
     # pykakasiの準備
@@ -256,6 +260,11 @@ def seed_data():
                         address=row.get('住所'),
                         bin_type=row.get('対象品目') or row.get('種類'),
                         note=row.get('備考'),
+                        collection_type=row.get('回収形態'),
+                        open_days=row.get('利用可能曜日'),
+                        open_time=row.get('開始時間'),
+                        close_time=row.get('終了時間'),
+                        hours_note=row.get('利用可能時間特記事項'),
                         latitude=lat,
                         longitude=lon
                     )
@@ -267,5 +276,14 @@ def seed_data():
         except FileNotFoundError:
             print(f"{bins_file} が見つかりません。")
 
+        # ---------------------------------------------------------
+        # 6. メモリ上のキャッシュを作り直す
+        # ※ 起動中の gunicorn には反映されないので、seed 後はアプリを再起動してください
+        # ---------------------------------------------------------
+        schedule_store.load_from_db()
+        response_cache.clear()
+        search_index.load_from_db()
+        bin_index.load_from_db()
+
 if __name__ == '__main__':
     seed_data()
\ No newline at end of file
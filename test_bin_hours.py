@@ -0,0 +1,55 @@
+import datetime
+
+import bin_hours
+from bin_hours import SLOTS_PER_DAY, slot_range
+
+# ---------------------------------------------------------
+# ゴミ箱の利用可能時間 (15分枠のビット列) の変換
+# ---------------------------------------------------------
+
+
+def slots(*ranges):
+    """(開始の枠, 終了の枠) の組をビット列にする"""
+    mask = 0
+    for first, last in ranges:
+        for slot in range(first, last):
+            mask |= 1 << slot
+    return mask
+
+
+def is_open(hours, text):
+    bin_hours.build([hours])
+    return bool(bin_hours.open_mask(datetime.datetime.fromisoformat(text)))
+
+
+def test_slot_range_same_day():
+    assert slot_range(9 * 60, 17 * 60 + 15) == slots((36, 69))
+
+
+def test_slot_range_overnight_spills_into_next_day():
+    # 22:00〜2:00 -> その日の 22:00〜24:00 と、翌日 (96 ビットより上) の 0:00〜2:00
+    assert slot_range(22 * 60, 2 * 60) == slots((88, 96), (SLOTS_PER_DAY, SLOTS_PER_DAY + 8))
+    # 同じ時刻なら24時間
+    assert slot_range(6 * 60, 6 * 60) == slots((24, 24 + SLOTS_PER_DAY))
+
+
+def test_overnight_hours_open_next_morning():
+    hours = bin_hours.parse("金", "22:00", "2:00", "")
+    assert is_open(hours, "2025-06-13T23:00")      # 金曜の夜
+    assert is_open(hours, "2025-06-14T01:00")      # 土曜の朝 (金曜の続き)
+    assert not is_open(hours, "2025-06-13T01:00")  # 金曜の朝は木曜の続きなので閉まっている
+    assert not is_open(hours, "2025-06-14T03:00")
+
+
+def test_overnight_sunday_wraps_to_monday():
+    hours = bin_hours.parse("日", "22:00", "2:00", "")
+    assert is_open(hours, "2025-06-16T01:00")      # 月曜の朝
+    assert not is_open(hours, "2025-06-15T01:00")  # 日曜の朝
+
+
+def test_new_year_holidays_until_january_4():
+    hours = bin_hours.parse("月火水木金土日", "9:00", "17:00", "年末年始は利用不可")
+    assert not is_open(hours, "2025-12-29T12:00")
+    assert not is_open(hours, "2026-01-04T12:00")
+    assert is_open(hours, "2026-01-05T12:00")
+    assert is_open(hours, "2025-12-28T12:00")
@@ -0,0 +1,107 @@
+import datetime
+import random
+
+import pytest
+
+import data_loader
+import predictor
+import schedule_store
+
+# ---------------------------------------------------------
+# 分別辞書の照合 (類似度の下限) と、辞書の分別名 -> trash_types.id の変換
+# ---------------------------------------------------------
+
+# 辞書の分別名 -> seed.py の trash_types.id (None はゴミ種類のない分別)
+EXPECTED_TYPE_IDS = {
+    "燃やせるごみ": 1,
+    "燃やせないごみ": 2,
+    "びん・缶・ペットボトル": 8,
+    "容器包装プラスチック": 9,
+    "雑がみ": 10,
+    "枝・葉・草": 11,
+    "大型ごみ": 99,
+    "スプレー缶・カセットボンベ": None,
+    "加熱式たばこ・電子たばこ、ライター": None,
+    "筒型乾電池": None,
+    "市で収集しないもの": None,
+    "集団資源回収など": None,
+    "（備考欄参照）": None,
+}
+
+
+def test_exact_match():
+    match = data_loader.match_dictionary("ペットボトル")
+    assert match["score"] == 1.0
+    assert match["method"] == "exact"
+    assert match["row"]["name_ja"] == "ペットボトル"
+
+
+def test_partial_match_needs_min_score():
+    # 「ペットボトル」を含むが、長さの比は 6/10 = 0.6
+    assert data_loader.match_dictionary("ペットボトルキャップ") is None
+    match = data_loader.match_dictionary("ペットボトルキャップ", min_score=0.6)
+    assert match["method"] == "partial"
+    assert match["score"] == pytest.approx(0.6)
+
+    # 以前は min_score の半分まで部分一致を受け付けていた
+    assert data_loader.match_dictionary("ボトル", min_score=0.6) is None
+
+
+def test_find_in_dictionary_uses_default_floor():
+    assert data_loader.MIN_MATCH >= 0.8
+    assert data_loader.find_in_dictionary("ペットボトルキャップ") is None
+    assert data_loader.find_in_dictionary("ペットボト")["name_ja"] == "ペットボトル"
+
+
+def test_match_score_never_below_min_score():
+    names = [row["name_ja"] for row in data_loader.get_dictionary_list() if row.get("name_ja")]
+    rng = random.Random(0)
+    for _ in range(500):
+        name = rng.choice(names)
+        start = rng.randint(0, len(name) - 1)
+        query = rng.choice([name[start:], name[:start + 1], name + "カバー", "新しい" + name])
+        for min_score in (0.6, 0.8):
+            match = data_loader.match_dictionary(query, min_score=min_score)
+            assert match is None or match["score"] >= min_score, (query, min_score, match)
+
+
+def test_dictionary_categories_map_to_trash_type_rows(seeded_app):
+    from models import TrashType
+
+    type_names = {t.id: t.name_ja for t in TrashType.query.all()}
+    categories = {row.get("trash_type_str") for row in data_loader.get_dictionary_list()}
+    assert categories <= set(EXPECTED_TYPE_IDS)
+
+    for category in categories:
+        expected = EXPECTED_TYPE_IDS[category]
+        assert schedule_store.type_id_for_category(category) == expected, category
+        if expected is not None:
+            assert expected in type_names
+
+
+def test_prompt_legend_lists_trash_type_ids(seeded_app):
+    legend = schedule_store.type_legend()
+    for type_id in (1, 2, 8, 9, 10, 11, 99):
+        assert f"{type_id}:" in legend
+    assert "3:" not in legend
+
+
+def test_scheduled_categories_have_next_date(seeded_app):
+    schedule_store.load_from_db()
+    for category, type_id in EXPECTED_TYPE_IDS.items():
+        if type_id is None or category == "大型ごみ":   # 大型ごみは申込制で収集日がない
+            continue
+        assert schedule_store.get_next_date(1, type_id, datetime.date(2025, 6, 15)), category
+
+
+def test_classify_text_romaji_uses_dictionary(seeded_app):
+    result = predictor.classify_text("petto botoru", 1, "ja")
+    assert result["model_used"] == "dictionary"
+    assert result["type_id"] == 8
+
+
+def test_unmapped_category_returns_no_type_id(seeded_app):
+    result = predictor.classify_text("スプレー缶", None, "ja")
+    assert result["model_used"] == "dictionary"
+    assert result["type_id"] is None
+    assert result["type"] == "スプレー缶・カセットボンベ"
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+import ai_fallback
+import ai_tiers
+import gemini_pool
+import predictor
+
+# ---------------------------------------------------------
+# 段階的なモデルの切り替え (run_tiered) の持ち時間の数え方
+# 全段で1つの持ち時間を分け合い、残りが少なければ聞き直さない
+# ---------------------------------------------------------
+TIERS = ["tier-a", "tier-b", "tier-c"]
+EMPTY_ANSWER = {"type_id": 1, "identified_name": ""}   # empty_name で必ず聞き直す回答
+
+
+@pytest.fixture(autouse=True)
+def tiers(monkeypatch):
+    monkeypatch.setattr(ai_tiers, "TIERS", TIERS)
+    monkeypatch.setattr(gemini_pool, "available_models", lambda models: list(models))
+
+
+def fake_run(monkeypatch, seconds):
+    """run_with_fallback を、seconds 秒かかって1段目のモデルが答えるものに置き換え、渡された持ち時間を記録する"""
+    budgets = []
+
+    def run_with_fallback(call, models, deadline_seconds=None, max_attempts=None):
+        budgets.append(deadline_seconds)
+        if deadline_seconds <= seconds:
+            time.sleep(max(deadline_seconds, 0))
+            raise ai_fallback.AllModelsFailed(TimeoutError("AI deadline exceeded"), timed_out=True)
+        time.sleep(seconds)
+        return EMPTY_ANSWER, models[0]
+
+    monkeypatch.setattr(ai_fallback, "run_with_fallback", run_with_fallback)
+    return budgets
+
+
+def test_tiers_share_one_deadline(monkeypatch):
+    monkeypatch.setattr(ai_fallback, "hedge_delay", lambda model_name: 0.05)
+    budgets = fake_run(monkeypatch, 0.2)
+
+    started = time.monotonic()
+    answer = predictor.run_tiered(None, {"empty_name"}, deadline=started + 1.0)
+
+    assert answer[1] == "tier-c"
+    assert len(budgets) == 3
+    # 段ごとに新しい持ち時間をもらわず、残りだけを渡している
+    assert budgets[0] <= 1.0
+    assert budgets[1] <= budgets[0] - 0.2 + 0.05
+    assert budgets[2] <= budgets[1] - 0.2 + 0.05
+
+
+def test_stops_escalating_when_time_is_short(monkeypatch):
+    monkeypatch.setattr(ai_fallback, "hedge_delay", lambda model_name: 5.0)
+    budgets = fake_run(monkeypatch, 0.1)
+
+    answer = predictor.run_tiered(None, {"empty_name"}, deadline=time.monotonic() + 1.0)
+
+    # 残り 0.9 秒は次の段のいつもの応答時間 (5秒) より短いので、1段目の回答を使う
+    assert answer[1] == "tier-a"
+    assert len(budgets) == 1
+
+
+def test_keeps_lower_tier_answer_at_deadline(monkeypatch):
+    monkeypatch.setattr(ai_fallback, "hedge_delay", lambda model_name: 0.01)
+    budgets = fake_run(monkeypatch, 0.3)
+
+    started = time.monotonic()
+    answer = predictor.run_tiered(None, {"empty_name"}, deadline=started + 0.5)
+    elapsed = time.monotonic() - started
+
+    assert answer[1] == "tier-a"
+    assert len(budgets) == 2
+    assert elapsed < 0.5 + 0.1
+
+
+def test_run_with_fallback_rejects_spent_budget():
+    with pytest.raises(ai_fallback.AllModelsFailed) as e:
+        ai_fallback.run_with_fallback(lambda model_name: {}, ["tier-a"], deadline_seconds=0)
+    assert e.value.timed_out
@@ -0,0 +1,79 @@
+import re
+import unicodedata
+
+import jaconv
+import pykakasi
+
+# ---------------------------------------------------------
+# 検索キーの正規化
+# 半角/全角・カタカナ/ひらがな・ローマ字の違いを吸収するための変換をまとめる。
+# 辞書側のキーは読み込み時に一度だけ作り、検索語も同じ変換を通して比較する。
+# ---------------------------------------------------------
+_kks = None
+
+# ローマ字入力で区切りとして使われがちな文字 ("petto botoru", "petto-botoru")
+_ROMAJI_SEPARATORS = re.compile(r"[\s\-_'・]+")
+
+
+def _kakasi():
+    # pykakasi の辞書読み込みは重いので最初に使うときに1回だけ作る
+    global _kks
+    if _kks is None:
+        _kks = pykakasi.kakasi()
+    return _kks
+
+
+def normalize(text):
+    """全角/半角をそろえ (NFKC)、大文字小文字を区別しない形にする"""
+    if not text:
+        return ""
+    return unicodedata.normalize('NFKC', str(text)).casefold().strip()
+
+
+def to_hiragana(text):
+    """カタカナ (半角カナを含む) をひらがなにそろえる。漢字はそのまま"""
+    return jaconv.kata2hira(normalize(text))
+
+
+def to_reading(text):
+    """漢字も含めて読みのひらがなに変換する (pykakasi)"""
+    text = normalize(text)
+    if not text:
+        return ""
+    return "".join(item['hira'] for item in _kakasi().convert(text))
+
+
+def to_romaji(text):
+    """読みをヘボン式ローマ字にして、区切り文字を取り除いたキーを返す"""
+    text = normalize(text)
+    if not text:
+        return ""
+    romaji = "".join(item['hepburn'] for item in _kakasi().convert(text))
+    return _ROMAJI_SEPARATORS.sub("", romaji)
+
+
+def is_ascii(text):
+    return all(ord(c) < 128 for c in text)
+
+
+def entry_keys(name_ja, name_kana):
+    """辞書1件分の日本語キー (表記・ひらがな・ローマ字) を返す"""
+    kana = to_hiragana(name_kana) if name_kana else to_reading(name_ja)
+    keys = {normalize(name_ja), to_hiragana(name_ja), kana, to_romaji(kana)}
+    keys.discard("")
+    return keys
+
+
+def query_keys(query):
+    """
+    検索語を辞書側と同じ形に変換した候補を返す。
+    ローマ字キーは英数字だけの入力のときに使う (日本語入力をローマ字にすると英語名まで拾うため)。
+    """
+    text = normalize(query)
+    if not text:
+        return set()
+    keys = {text, to_hiragana(text)}
+    if is_ascii(text):
+        keys.add(_ROMAJI_SEPARATORS.sub("", text))
+    keys.discard("")
+    return keys
@@ -1,19 +1,21 @@
 import csv
-import time
+import json
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
+import rate_limiter
+import ai_backend
+import gemini_pool
 
 # .env から APIキーを読み込む
 load_dotenv()
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
-if not GEMINI_API_KEY:
+# AI_BACKEND=stub / replay のときはAPIキーなしで試せる
+if not GEMINI_API_KEY and ai_backend.MODE in ('gemini', 'record'):
     print("エラー: .envファイルに GEMINI_API_KEY が設定されていません。")
     exit()
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-flash-latest')
+MODEL_NAME = 'gemini-flash-latest'
 
 # 入力ファイルと出力ファイル
 INPUT_FILE = 'dataset/trash_dictionary.csv'
@@ -54,10 +56,10 @@ def translate_chunk(chunk_data):
     """
     
     try:
-        response = model.generate_content(prompt)
+        # サーバーと同じクライアント (AI_BACKEND で本物 / 代用サーバー / 記録の再生を切り替え)
+        response = gemini_pool.generate_content(MODEL_NAME, contents=prompt)
         # 余計な文字を削除
         text = response.text.replace('```json', '').replace('```', '').strip()
-        import json
         return json.loads(text)
     except Exception as e:
         print(f"翻訳エラー: {e}")
@@ -99,6 +101,10 @@ def main():
                 # 必要な列だけ結合
                 chunk_text += f"{row.get('品目')},{row.get('分別区分')},{row.get('手数料')},{row.get('備考')}\n"
             
+            # API制限にかからないよう、サーバーと共通のクォータ枠が空くまで待つ
+            # (見込みトークン数: 入力 + 7ヶ国語分の出力)
+            rate_limiter.acquire(MODEL_NAME, tokens=len(chunk_text) * 8, max_wait=300)
+
             # AI翻訳実行
             translated_list = translate_chunk(chunk_text)
             
@@ -110,9 +116,6 @@ def main():
             else:
                 print(" -> 翻訳失敗（スキップします）")
 
-            # API制限にかからないように少し休憩
-            time.sleep(2)
-
     print(f"✅ 全ての翻訳が完了しました！ '{OUTPUT_FILE}' を確認してください。")
 
 if __name__ == '__main__':